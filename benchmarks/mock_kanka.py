@@ -0,0 +1,241 @@
+"""Local fake of the Kanka REST API for benchmarks.
+
+Serves campaigns, every entity type of kanka_schema (characters, locations,
+notes, journals, ...), entity lookups and posts, with Kanka's pagination
+(`page`, `limit`, `meta.last_page`), `lastSync` deltas, ETag / 304
+revalidation and rate-limit headers. Latency and 429 responses are
+configurable.
+
+Run it standalone to point a real server at it:
+
+    python benchmarks/mock_kanka.py --port 9000 --latency 0.05
+    KANKA_API_BASE=http://127.0.0.1:9000/1.0 KANKA_API_KEY=x python kanka_mcp.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+ENTITY_TYPES = (
+    "characters", "locations", "notes", "journals", "organisations", "families", "items", "quests",
+    "events", "races", "creatures", "abilities", "timelines", "maps", "calendars", "tags",
+)
+DEFAULT_COUNTS = {"characters": 200, "locations": 50, "notes": 30, "journals": 20}
+
+_ENTITY_PATH = re.compile(r"campaigns/(\d+)/entities/(\d+)(?:/posts(?:/(\d+))?)?")
+_TYPED_PATH = re.compile(r"campaigns/(\d+)/(\w+)(?:/(\d+))?")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class MockKanka:
+    """In-memory campaign data plus the behaviour knobs of the fake API.
+
+    Attributes:
+        latency: Seconds every response is delayed by
+        per_page: Default page size of list endpoints
+        rate_limit_every: Answer every n-th request with 429 (0 disables)
+        calls: Number of requests received, by method
+    """
+
+    def __init__(self, latency: float = 0.0, per_page: int = 15, rate_limit_every: int = 0,
+                 counts: dict = None, posts_per_entity: int = 2):
+        self.latency = latency
+        self.per_page = per_page
+        self.rate_limit_every = rate_limit_every
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.total_calls = 0
+        self.entities = {}
+        self.posts = {}
+        self.data = {1: {entity_type: {} for entity_type in ENTITY_TYPES}}
+        self._next_entity = 1000
+        for entity_type, count in (counts or DEFAULT_COUNTS).items():
+            for index in range(1, count + 1):
+                record = self.create(1, entity_type, {
+                    "name": f"{entity_type[:-1].title()} {index}",
+                    "type": "npc",
+                    "entry": f"<p>Entry of {entity_type} {index}</p>",
+                    "location_id": 1 if entity_type == "characters" else None,
+                })
+                for post in range(1, posts_per_entity + 1):
+                    self.posts.setdefault(record["entity_id"], {})[post] = {
+                        "id": post, "entity_id": record["entity_id"], "name": f"Post {post}", "entry": "<p>...</p>",
+                    }
+
+    def create(self, campaign_id: int, entity_type: str, body: dict) -> dict:
+        records = self.data.setdefault(campaign_id, {}).setdefault(entity_type, {})
+        object_id = max(records, default=0) + 1
+        self._next_entity += 1
+        now = _now()
+        record = {**body, "id": object_id, "entity_id": self._next_entity, "created_at": now, "updated_at": now}
+        records[object_id] = record
+        self.entities[self._next_entity] = (entity_type, object_id)
+        return record
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls = {}
+            self.total_calls = 0
+
+
+def make_handler(api: MockKanka):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately; don't let Nagle delay the body.
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status: int, body=None, headers=None):
+            payload = b"" if body is None else json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("X-RateLimit-Limit", "1000000")
+            self.send_header("X-RateLimit-Remaining", "1000000")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def send_list(self, rows: list, query: dict):
+            per_page = int(query.get("limit", api.per_page))
+            page = int(query.get("page", 1))
+            last_page = max(1, -(-len(rows) // per_page))
+            self.send(200, {
+                "data": rows[(page - 1) * per_page: page * per_page],
+                "meta": {"current_page": page, "last_page": last_page, "per_page": per_page, "total": len(rows)},
+                "sync": _now(),
+            })
+
+        def handle_method(self, method: str):
+            with api.lock:
+                api.total_calls += 1
+                api.calls[method] = api.calls.get(method, 0) + 1
+                number = api.total_calls
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+            if api.latency:
+                time.sleep(api.latency)
+            if api.rate_limit_every and number % api.rate_limit_every == 0:
+                return self.send(429, {"message": "Too Many Attempts."}, {"Retry-After": "0"})
+            url = urlsplit(self.path)
+            query = dict(parse_qsl(url.query))
+            path = url.path.split("/1.0/", 1)[-1].strip("/")
+            if path == "campaigns":
+                return self.send(200, {"data": [{"id": campaign_id, "name": f"Campaign {campaign_id}"} for campaign_id in api.data]})
+            match = re.fullmatch(r"campaigns/(\d+)", path)
+            if match and int(match.group(1)) in api.data:
+                return self.send(200, {"data": {"id": int(match.group(1)), "name": f"Campaign {match.group(1)}"}})
+            match = _ENTITY_PATH.fullmatch(path)
+            if match:
+                return self.handle_entity(method, int(match.group(1)), int(match.group(2)), match.group(3), body, query, "/posts" in path)
+            match = _TYPED_PATH.fullmatch(path)
+            if match:
+                return self.handle_typed(method, int(match.group(1)), match.group(2), match.group(3), body, query)
+            self.send(404, {"message": "Not found."})
+
+        def handle_entity(self, method, campaign_id, entity_id, post_id, body, query, posts):
+            if not posts:
+                if entity_id not in api.entities:
+                    return self.send(404, {"message": "Not found."})
+                entity_type, object_id = api.entities[entity_id]
+                record = api.data[campaign_id][entity_type][object_id]
+                return self.send(200, {"data": {"id": entity_id, "name": record["name"], "type": entity_type[:-1], "child_id": object_id}})
+            entity_posts = api.posts.setdefault(entity_id, {})
+            if post_id is None:
+                if method == "GET":
+                    return self.send_list(list(entity_posts.values()), query)
+                new_id = max(entity_posts, default=0) + 1
+                entity_posts[new_id] = {**body, "id": new_id, "entity_id": entity_id}
+                return self.send(201, {"data": entity_posts[new_id]})
+            post_id = int(post_id)
+            if post_id not in entity_posts:
+                return self.send(404, {"message": "Not found."})
+            if method == "GET":
+                return self.send(200, {"data": entity_posts[post_id]})
+            if method in ("PUT", "PATCH"):
+                entity_posts[post_id].update(body)
+                return self.send(200, {"data": entity_posts[post_id]})
+            del entity_posts[post_id]
+            return self.send(204)
+
+        def handle_typed(self, method, campaign_id, entity_type, object_id, body, query):
+            records = api.data.setdefault(campaign_id, {}).setdefault(entity_type, {})
+            if object_id is None:
+                if method == "GET":
+                    rows = list(records.values())
+                    if "lastSync" in query:
+                        rows = [row for row in rows if row["updated_at"] > query["lastSync"]]
+                    return self.send_list(rows, query)
+                with api.lock:
+                    record = api.create(campaign_id, entity_type, body)
+                return self.send(201, {"data": record})
+            object_id = int(object_id)
+            if object_id not in records:
+                return self.send(404, {"message": "Not found."})
+            record = records[object_id]
+            if method == "GET":
+                etag = f'"{record["updated_at"]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send(304)
+                return self.send(200, {"data": record}, {"ETag": etag})
+            if method in ("PUT", "PATCH"):
+                record.update(body)
+                record["updated_at"] = _now()
+                return self.send(200, {"data": record})
+            del records[object_id]
+            return self.send(204)
+
+        def do_GET(self):
+            self.handle_method("GET")
+
+        def do_POST(self):
+            self.handle_method("POST")
+
+        def do_PUT(self):
+            self.handle_method("PUT")
+
+        def do_PATCH(self):
+            self.handle_method("PATCH")
+
+        def do_DELETE(self):
+            self.handle_method("DELETE")
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, **options):
+    """Start the fake API in a background thread; return it and its base URL."""
+    api = MockKanka(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return api, f"http://{host}:{server.server_address[1]}/1.0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake of the Kanka API")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every response")
+    parser.add_argument("--per-page", type=int, default=15)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every n-th request with 429")
+    args = parser.parse_args()
+    _, url = serve(port=args.port, latency=args.latency, per_page=args.per_page, rate_limit_every=args.rate_limit_every)
+    print(f"Mock Kanka API at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
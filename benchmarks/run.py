@@ -0,0 +1,139 @@
+"""Offline benchmarks of the MCP tools against the local fake Kanka API.
+
+Each scenario is run at every concurrency level with a cold client (fresh
+cache, connection pool and rate-limit bucket) whose setup is not timed. Tool calls go through
+`mcp.call_tool`, so argument validation, response shaping and metrics are
+included in the timings. For each run the tool latency p50 / p99, calls per
+second, requests that reached the mock API and 429 retries are reported.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --scenario list --concurrency 1 8 32 --latency 0.1 --rate-limit-every 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_kanka import serve  # noqa: E402
+
+SCENARIOS = ("get", "list", "mixed")
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def _calls(scenario: str, requests: int, distinct: int, seed: int) -> list:
+    """The (tool, arguments) pairs a run issues, in order."""
+    rng = random.Random(seed)
+    calls = []
+    for _ in range(requests):
+        character_id = rng.randint(1, distinct)
+        roll = rng.random() if scenario == "mixed" else 0.0
+        if scenario == "list" or 0.80 <= roll < 0.95:
+            calls.append(("list_characters", {"campaign_id": 1, "max_items": 100, "compact": True}))
+        elif roll >= 0.95:
+            calls.append(("update_character", {"campaign_id": 1, "character_id": character_id, "title": f"Bench {rng.random():.6f}"}))
+        else:
+            calls.append(("get_character", {"campaign_id": 1, "character_id": character_id}))
+    return calls
+
+
+async def run_once(kanka_mcp, api, calls: list, concurrency: int) -> dict:
+    from kanka_metrics import metrics
+    from kanka_registry import WorkspaceRegistry
+
+    kanka_mcp._registry = WorkspaceRegistry()
+    # Open the workspace up front so its setup isn't timed; its cache stays cold.
+    kanka_mcp._registry.get(os.environ["KANKA_API_KEY"])
+    api.reset_calls()
+    retries = metrics.retries
+    latencies = []
+    errors = 0
+    pending = iter(calls)
+
+    async def worker():
+        nonlocal errors
+        for name, arguments in pending:
+            started = time.perf_counter()
+            try:
+                await kanka_mcp.mcp.call_tool(name, arguments)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    for workspace in list(kanka_mcp._registry._workspaces.values()):
+        await workspace.aclose()
+    return {
+        "concurrency": concurrency,
+        "calls": len(calls),
+        "errors": errors,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "calls_per_second": round(len(calls) / elapsed, 1),
+        "upstream_requests": api.total_calls,
+        "upstream_by_method": dict(api.calls),
+        "retries_429": metrics.retries - retries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Kanka MCP tools against a local fake Kanka API")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="Tool calls per run")
+    parser.add_argument("--distinct", type=int, default=50, help="Distinct characters the calls are spread over")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the mock API adds to every response")
+    parser.add_argument("--per-page", type=int, default=15, help="Default page size of the mock API")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every n-th upstream request with 429")
+    parser.add_argument("--characters", type=int, default=200, help="Characters in the mock campaign")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    api, url = serve(
+        latency=args.latency,
+        per_page=args.per_page,
+        rate_limit_every=args.rate_limit_every,
+        counts={"characters": args.characters, "locations": 20},
+    )
+    os.environ.update({"KANKA_API_BASE": url, "KANKA_API_KEY": "benchmark", "KANKA_RATE_LIMIT": "1000000"})
+    os.environ.pop("KANKA_STORE_PATH", None)
+    import kanka_mcp
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = []
+    for scenario in scenarios:
+        calls = _calls(scenario, args.requests, min(args.distinct, args.characters), args.seed)
+        for concurrency in args.concurrency:
+            result = asyncio.run(run_once(kanka_mcp, api, calls, concurrency))
+            results.append({"scenario": scenario, **result})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"mock latency {args.latency * 1000:.0f} ms, page size {args.per_page}, "
+          f"429 every {args.rate_limit_every or 'never'}, {args.requests} calls per run")
+    header = f"{'scenario':<8} {'conc':>5} {'p50 ms':>9} {'p99 ms':>9} {'calls/s':>9} {'upstream':>9} {'429s':>5} {'errors':>6}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result['scenario']:<8} {result['concurrency']:>5} {result['p50_ms']:>9} {result['p99_ms']:>9} "
+            f"{result['calls_per_second']:>9} {result['upstream_requests']:>9} {result['retries_429']:>5} {result['errors']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Cold-start time of the stdio server.
+
+Spawns `python kanka_mcp.py` without an API key, as an MCP client would,
+and times the answers to `initialize` and `tools/list` from the moment the
+process is started. Exits with status 1 when the median time to the tool
+list exceeds `--target-ms`, so it can guard startup time in CI.
+
+    python benchmarks/startup.py --runs 5 --target-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGES = (
+    {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {
+        "protocolVersion": "2025-06-18", "capabilities": {}, "clientInfo": {"name": "startup-benchmark", "version": "1"},
+    }},
+    {"jsonrpc": "2.0", "method": "notifications/initialized"},
+    {"jsonrpc": "2.0", "id": 2, "method": "tools/list"},
+)
+
+
+def measure() -> dict:
+    """Start one server process and return the milliseconds until each answer."""
+    env = {name: value for name, value in os.environ.items() if name != "KANKA_API_KEY"}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "kanka_mcp.py")],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, text=True,
+    )
+    try:
+        process.stdin.write("".join(json.dumps(message) + "\n" for message in MESSAGES))
+        process.stdin.flush()
+        timings = {}
+        while len(timings) < 2:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError("the server exited before answering")
+            reply = json.loads(line)
+            if "error" in reply:
+                raise RuntimeError(reply["error"])
+            name = "initialize_ms" if reply.get("id") == 1 else "tools_list_ms"
+            timings[name] = (time.perf_counter() - started) * 1000
+            if reply.get("id") == 2:
+                timings["tools"] = len(reply["result"]["tools"])
+        return timings
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold-start time of the stdio server")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=None, help="Fail when the median time to the tool list exceeds this")
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    initialize = statistics.median(run["initialize_ms"] for run in runs)
+    tools_list = statistics.median(run["tools_list_ms"] for run in runs)
+    print(f"{args.runs} runs, {runs[0]['tools']} tools")
+    print(f"initialize  median {initialize:.0f} ms, min {min(run['initialize_ms'] for run in runs):.0f} ms")
+    print(f"tools/list  median {tools_list:.0f} ms, min {min(run['tools_list_ms'] for run in runs):.0f} ms")
+    if args.target_ms is not None and tools_list > args.target_ms:
+        print(f"over the {args.target_ms:.0f} ms target")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
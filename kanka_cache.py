@@ -0,0 +1,175 @@
+import os
+import time
+from collections import OrderedDict
+
+# Seconds a cached response stays fresh, per resource type.
+DEFAULT_TTLS = {
+    "campaigns": 300,
+    "characters": 60,
+    "locations": 120,
+    "notes": 60,
+    "journals": 60,
+    "posts": 30,
+}
+DEFAULT_TTL = 60
+
+
+def parse_path(path: str):
+    """Split an API path into (campaign_id, resource, object_id).
+
+    Posts are nested under their entity, so their resource is
+    "entities/<entity_id>/posts" to keep each entity's posts separate.
+    """
+    parts = path.strip("/").split("/")
+    if len(parts) < 3 or parts[0] != "campaigns":
+        return None, parts[0], None
+    campaign_id = int(parts[1])
+    if parts[2] == "entities" and len(parts) >= 5:
+        resource = "/".join(parts[2:5])
+        object_id = parts[5] if len(parts) > 5 else None
+    else:
+        resource = parts[2]
+        object_id = parts[3] if len(parts) > 3 else None
+    return campaign_id, resource, int(object_id) if object_id and object_id.isdigit() else object_id
+
+
+def _parse_ttls(value: str) -> dict:
+    ttls = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        resource, _, seconds = item.partition("=")
+        ttls[resource.strip()] = float(seconds)
+    return ttls
+
+
+class ResponseCache:
+    """In-process LRU cache of Kanka GET responses with per-resource TTLs.
+
+    Entries are keyed on (campaign_id, resource, object_id, query). Writes to
+    a resource invalidate the written object and every cached list of that
+    resource in the same campaign.
+
+    Responses that carry an ETag or Last-Modified validator are kept after
+    they expire, so the client can revalidate them with a conditional
+    request and keep the cached body on 304 Not Modified.
+
+    Configuration through environment variables:
+        KANKA_CACHE_SIZE: Maximum number of cached responses (default 1000, 0 disables)
+        KANKA_CACHE_TTLS: Per-resource TTL overrides, e.g. "characters=30,campaigns=600"
+    """
+
+    def __init__(self, max_size: int = None, ttls: dict = None):
+        if max_size is None:
+            max_size = int(os.getenv("KANKA_CACHE_SIZE", "1000"))
+        self.max_size = max_size
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(_parse_ttls(os.getenv("KANKA_CACHE_TTLS", "")))
+        self.ttls.update(ttls or {})
+        self._entries = OrderedDict()
+        self._by_resource = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.revalidations = 0
+
+    @staticmethod
+    def key(path: str, params: dict = None):
+        campaign_id, resource, object_id = parse_path(path)
+        query = tuple(sorted((params or {}).items()))
+        return campaign_id, resource, object_id, query
+
+    def ttl(self, resource: str) -> float:
+        return self.ttls.get(resource.rsplit("/", 1)[-1], DEFAULT_TTL)
+
+    def get(self, key):
+        """Return the fresh cached value for `key`, or None."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            if entry is not None and not entry[2]:
+                self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def conditional_headers(self, key) -> dict:
+        """Return If-None-Match / If-Modified-Since headers for a stale entry."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return {}
+        validators = entry[2]
+        headers = {}
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last-modified" in validators:
+            headers["If-Modified-Since"] = validators["last-modified"]
+        return headers
+
+    def refresh(self, key):
+        """Mark a stale entry fresh again after a 304 and return its value."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries[key] = (time.monotonic() + self.ttl(key[1]), entry[1], entry[2])
+        self._entries.move_to_end(key)
+        self.revalidations += 1
+        return entry[1]
+
+    def put(self, key, value, validators: dict = None):
+        if self.max_size <= 0:
+            return
+        validators = validators or {}
+        ttl = self.ttl(key[1])
+        if ttl <= 0 and not validators:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value, validators)
+        self._entries.move_to_end(key)
+        self._by_resource.setdefault(key[:2], set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, campaign_id, resource, object_id=None):
+        """Drop cached copies of an object and all lists of its resource."""
+        for key in list(self._by_resource.get((campaign_id, resource), ())):
+            if key[2] is None or key[2] == object_id:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_resource(self, campaign_id, resource):
+        """Drop every cached response of a resource in a campaign."""
+        for key in list(self._by_resource.get((campaign_id, resource), ())):
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_path(self, path: str):
+        campaign_id, resource, object_id = parse_path(path)
+        self.invalidate(campaign_id, resource, object_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_resource.clear()
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_resource.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_resource[key[:2]]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "revalidations": self.revalidations,
+            "ttls": self.ttls,
+        }
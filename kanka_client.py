@@ -0,0 +1,407 @@
+import asyncio
+import base64
+import contextvars
+import importlib.util
+import json
+import os
+import re
+import time
+import httpx
+from kanka_cache import ResponseCache, parse_path
+from kanka_metrics import metrics
+from kanka_ratelimit import PRIORITY_READ, PRIORITY_WRITE, RateLimiter
+
+KANKA_API_BASE = "https://api.kanka.io/1.0"
+
+_CAMPAIGN_PATH = re.compile(r"^campaigns/(\d+)")
+
+# Scheduling priority for requests made in the current task, e.g. by bulk tools.
+request_priority = contextvars.ContextVar("kanka_request_priority", default=None)
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def encode_cursor(page: int, offset: int, limit: int = None) -> str:
+    """Encode a list position as an opaque continuation cursor."""
+    state = {"page": page, "offset": offset, "limit": limit}
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        state = json.loads(base64.urlsafe_b64decode(padded))
+        return {"page": int(state["page"]), "offset": int(state["offset"]), "limit": state.get("limit")}
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def _validators(response: httpx.Response) -> dict:
+    validators = {}
+    for header in ("etag", "last-modified"):
+        value = response.headers.get(header)
+        if value:
+            validators[header] = value
+    return validators
+
+
+def campaign_of(path: str):
+    """Return the campaign ID a request path belongs to, or None."""
+    match = _CAMPAIGN_PATH.match(path.lstrip("/"))
+    return int(match.group(1)) if match else None
+
+
+class KankaClient:
+    """Pooled, keep-alive async HTTP client shared by every Kanka tool.
+
+    Requests for the same campaign are bounded by a per-campaign concurrency
+    limit, so one busy campaign cannot monopolise the connection pool.
+    GET responses are served from a read-through `ResponseCache`, which
+    successful writes invalidate. Expired entries with an ETag or
+    Last-Modified validator are revalidated with a conditional request.
+
+    Every request passes through a `RateLimiter`, which meters requests to
+    stay under Kanka's per-minute limit, serves reads before writes and
+    retries requests rejected with 429 Too Many Requests.
+
+    Observers registered in `observers` are called as
+    `observer.observe(method, path, params, result)` after every successful
+    request that reached Kanka. An attached store additionally serves fresh
+    single-entity reads from disk before the network is tried. Concurrent
+    identical GETs are coalesced into one request and share its result.
+    When a write-behind queue is attached as `write_queue`, reads first send
+    the queued updates they would otherwise miss, and deletes drop them.
+    HTTP/2 is negotiated when the optional `h2` package is installed.
+
+    Connection settings can be tuned with environment variables:
+        KANKA_POOL_SIZE: Maximum number of kept-alive connections (default 10)
+        KANKA_CONNECT_TIMEOUT: Seconds to wait for a connection (default 5)
+        KANKA_READ_TIMEOUT: Seconds to wait for a response (default 30)
+        KANKA_CAMPAIGN_CONCURRENCY: Maximum in-flight requests per campaign (default 4)
+        KANKA_LIST_MAX_ITEMS: Default cap on items returned by one list call (default 500)
+        KANKA_API_BASE: Base URL of the Kanka API, e.g. a local mock for benchmarks
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = None,
+        pool_size: int = None,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        campaign_concurrency: int = None,
+        transport: httpx.AsyncBaseTransport = None,
+    ):
+        self.base_url = (base_url or os.getenv("KANKA_API_BASE", KANKA_API_BASE)).rstrip("/")
+        self.pool_size = pool_size or _env_int("KANKA_POOL_SIZE", 10)
+        self.connect_timeout = connect_timeout or _env_float("KANKA_CONNECT_TIMEOUT", 5.0)
+        self.read_timeout = read_timeout or _env_float("KANKA_READ_TIMEOUT", 30.0)
+        self.campaign_concurrency = campaign_concurrency or _env_int("KANKA_CAMPAIGN_CONCURRENCY", 4)
+        self.list_max_items = _env_int("KANKA_LIST_MAX_ITEMS", 500)
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self._transport = transport or httpx.AsyncHTTPTransport(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+        )
+        self.session = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            headers={
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+                "Authorization": f"Bearer {api_key}",
+            },
+        )
+        self.cache = ResponseCache()
+        self.limiter = RateLimiter()
+        self.observers = []
+        self.store = None
+        self.write_queue = None
+        self._campaign_slots = {}
+        self.requests_sent = 0
+        self.in_flight = 0
+        self._in_flight_gets = {}
+        self.coalesced = 0
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def attach_store(self, store):
+        """Mirror responses into `store` and serve fresh reads from it."""
+        self.store = store
+        self.observers.append(store)
+
+    def _notify(self, method: str, path: str, params: dict, result):
+        for observer in self.observers:
+            observer.observe(method, path, params, result)
+
+    def _slot(self, path: str):
+        campaign_id = campaign_of(path)
+        slot = self._campaign_slots.get(campaign_id)
+        if slot is None:
+            slot = self._campaign_slots[campaign_id] = asyncio.Semaphore(self.campaign_concurrency)
+        return slot
+
+    async def request(self, method: str, path: str, priority: int = None, **kwargs) -> httpx.Response:
+        if priority is None:
+            priority = request_priority.get()
+        if priority is None:
+            priority = PRIORITY_READ if method == "GET" else PRIORITY_WRITE
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            await self.limiter.acquire(priority)
+            metrics.record_wait(time.perf_counter() - started)
+            async with self._slot(path):
+                self.requests_sent += 1
+                self.in_flight += 1
+                try:
+                    with metrics.upstream(method, path) as span:
+                        response = await self.session.request(method, self.url(path), **kwargs)
+                        metrics.record_response(method, path, response, span)
+                finally:
+                    self.in_flight -= 1
+            self.limiter.update(response.headers)
+            if response.status_code != 429 or attempt >= self.limiter.max_retries:
+                return response
+            self.limiter.backoff(response.headers, attempt)
+            self.limiter.retries += 1
+            metrics.record_retry()
+            attempt += 1
+
+    async def get(self, path: str, params: dict = None, use_cache: bool = True, priority: int = None):
+        if self.write_queue is not None:
+            await self.write_queue.flush_related(path)
+        key = self.cache.key(path, params)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.record_cache("hit")
+                return cached
+            if self.store is not None:
+                local = self.store.read(path, params)
+                if local is not None:
+                    metrics.record_cache("store_hit")
+                    self.cache.put(key, local)
+                    return local
+            metrics.record_cache("miss")
+        # Identical GETs already on their way to Kanka share that request.
+        flight = self._in_flight_gets.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._fetch(key, path, params, use_cache, priority))
+            self._in_flight_gets[key] = flight
+            flight.add_done_callback(lambda done: self._land(key, done))
+        else:
+            self.coalesced += 1
+            metrics.record_cache("coalesced")
+        return await asyncio.shield(flight)
+
+    def _land(self, key: str, flight: asyncio.Future):
+        if self._in_flight_gets.get(key) is flight:
+            del self._in_flight_gets[key]
+        if not flight.cancelled():
+            flight.exception()  # retrieved here in case every waiter was cancelled
+
+    async def _fetch(self, key: str, path: str, params: dict, use_cache: bool, priority: int):
+        headers = self.cache.conditional_headers(key) if use_cache else {}
+        response = await self.request("GET", path, priority, params=params, headers=headers)
+        if response.status_code == 304:
+            cached = self.cache.refresh(key)
+            if cached is not None:
+                metrics.record_cache("revalidated")
+                return cached
+            response = await self.request("GET", path, priority, params=params)
+        response.raise_for_status()
+        result = response.json()
+        # A write during the request detaches the flight; its result may predate the write.
+        if use_cache and self._in_flight_gets.get(key) is asyncio.current_task():
+            self.cache.put(key, result, _validators(response))
+        self._notify("GET", path, params, result)
+        return result
+
+    def _invalidate(self, path: str):
+        """Drop the cached and in-flight reads a write to `path` makes stale."""
+        self.cache.invalidate_path(path)
+        campaign_id, resource, object_id = parse_path(path)
+        stale = [
+            key for key in self._in_flight_gets
+            if key[:2] == (campaign_id, resource) and key[2] in (None, object_id)
+        ]
+        for key in stale:
+            del self._in_flight_gets[key]
+
+    async def iter_pages(
+        self,
+        path: str,
+        params: dict = None,
+        start_page: int = 1,
+        use_cache: bool = True,
+        priority: int = None,
+    ):
+        """Yield every page of a list endpoint in order.
+
+        The first page is fetched alone to learn `meta.last_page`; the rest
+        are fetched concurrently in windows of the campaign concurrency, so
+        at most one window of pages is held in memory at a time.
+        """
+        params = dict(params or {})
+        first = await self.get(path, {**params, "page": start_page}, use_cache, priority)
+        yield first
+        last_page = (first.get("meta") or {}).get("last_page") or start_page
+        page = start_page + 1
+        while page <= last_page:
+            window = range(page, min(page + self.campaign_concurrency, last_page + 1))
+            results = await asyncio.gather(*(self.get(path, {**params, "page": p}, use_cache, priority) for p in window))
+            for result in results:
+                yield result
+            page = window[-1] + 1
+
+    async def paginate(
+        self,
+        path: str,
+        params: dict = None,
+        page: int = None,
+        limit: int = None,
+        max_items: int = None,
+        cursor: str = None,
+    ) -> dict:
+        """Fetch a list endpoint across pages.
+
+        With only `page` set, exactly that page is returned. Otherwise items are
+        collected from the start (or cursor) position until `max_items` is
+        reached, fetching the required pages concurrently once the first
+        page's `meta` is known. When more items remain, the result carries a
+        `next_cursor` that continues where this call stopped.
+        """
+        offset = 0
+        if cursor:
+            state = decode_cursor(cursor)
+            page, offset, limit = state["page"], state["offset"], state["limit"] or limit
+        params = dict(params or {})
+        if limit:
+            params["limit"] = limit
+        single_page = page is not None and max_items is None and not cursor
+        start_page = page or 1
+
+        first = await self.get(path, {**params, "page": start_page})
+        meta = first.get("meta") or {}
+        items = list(first.get("data") or [])[offset:]
+        if single_page:
+            max_items = len(items)
+        elif not max_items:
+            max_items = self.list_max_items
+        per_page = meta.get("per_page") or len(first.get("data") or []) or 1
+        last_page = meta.get("last_page") or start_page
+        total = meta.get("total", len(items))
+
+        to_page = start_page
+        if len(items) < max_items and start_page < last_page:
+            needed = -(-(max_items - len(items)) // per_page)
+            to_page = min(last_page, start_page + needed)
+            pages = range(start_page + 1, to_page + 1)
+            results = await asyncio.gather(*(self.get(path, {**params, "page": p}) for p in pages))
+            for result in results:
+                items.extend(result.get("data") or [])
+        items = items[:max_items]
+
+        position = (start_page - 1) * per_page + offset + len(items)
+        next_cursor = None
+        if position < total:
+            next_cursor = encode_cursor(position // per_page + 1, position % per_page, limit)
+        return {
+            "data": items,
+            "meta": {
+                "total": total,
+                "per_page": per_page,
+                "last_page": last_page,
+                "from_page": start_page,
+                "to_page": to_page,
+                "returned": len(items),
+            },
+            "next_cursor": next_cursor,
+        }
+
+    async def post(self, path: str, data: dict, priority: int = None):
+        response = await self.request("POST", path, priority, json=data)
+        response.raise_for_status()
+        self._invalidate(path)
+        result = response.json()
+        self._notify("POST", path, None, result)
+        return result
+
+    async def put(self, path: str, data: dict, priority: int = None):
+        response = await self.request("PUT", path, priority, json=data)
+        response.raise_for_status()
+        self._invalidate(path)
+        result = response.json()
+        self._notify("PUT", path, None, result)
+        return result
+
+    async def patch(self, path: str, data: dict, priority: int = None):
+        """Update only the given fields of an object, leaving the others untouched on Kanka.
+
+        Every given field is sent: a local copy may predate edits made
+        elsewhere, so it cannot tell which fields already hold their value.
+        """
+        response = await self.request("PATCH", path, priority, json=data)
+        response.raise_for_status()
+        self._invalidate(path)
+        result = response.json()
+        if isinstance(result.get("data"), dict):
+            # The answer is the whole updated object: keep it for the next read.
+            self.cache.put(self.cache.key(path), result)
+        self._notify("PATCH", path, None, result)
+        return result
+
+    async def delete(self, path: str, priority: int = None):
+        if self.write_queue is not None:
+            self.write_queue.discard(path)
+        response = await self.request("DELETE", path, priority)
+        if response.status_code == 204:
+            self._invalidate(path)
+            self._notify("DELETE", path, None, None)
+            return {"success": True}
+        response.raise_for_status()
+        return {"success": False, "error": response.text}
+
+    def pool_stats(self) -> dict:
+        """Return connection pool usage for monitoring."""
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(pool.connections) if pool is not None else []
+        return {
+            "pool_size": self.pool_size,
+            "http2": self.http2,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+            "campaign_concurrency": self.campaign_concurrency,
+            "requests_sent": self.requests_sent,
+            "in_flight": self.in_flight,
+            "coalesced_gets": self.coalesced,
+            "open_connections": len(connections),
+            "idle_connections": sum(1 for conn in connections if conn.is_idle()),
+            "connections": [conn.info() for conn in connections],
+        }
+
+    def stats(self) -> dict:
+        stats = {"pool": self.pool_stats(), "cache": self.cache.stats(), "rate_limit": self.limiter.stats()}
+        if self.store is not None:
+            stats["store"] = self.store.stats()
+        if self.write_queue is not None:
+            stats["write_behind"] = self.write_queue.stats()
+        return stats
+
+    async def aclose(self):
+        await self.session.aclose()
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,203 @@
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import os
+from kanka_ratelimit import PRIORITY_BULK
+from kanka_schema import ENTITY_TYPES
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+COMPRESSIONS = ("gzip", "zstd")
+_EXTENSIONS = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+
+def compression_for(path: str, compression: str = None):
+    """Return the compression to use for `path`: the given one, or the one its extension implies."""
+    if compression in (None, ""):
+        compression = _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if compression in (None, "none"):
+        return None
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression} (use gzip, zstd or none)")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+    return compression
+
+
+def confined_path(path: str, base: str) -> str:
+    """Resolve the relative `path` inside the directory `base`.
+
+    Raises ValueError for absolute paths, `..` components and paths that
+    leave `base` through a symbolic link.
+    """
+    if os.path.isabs(path) or ".." in path.replace("\\", "/").split("/"):
+        raise ValueError(f"{path} must be a relative path inside the export directory")
+    base = os.path.realpath(base)
+    resolved = os.path.realpath(os.path.join(base, path))
+    if os.path.commonpath((base, resolved)) != base or resolved == base:
+        raise ValueError(f"{path} is outside the export directory")
+    return resolved
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    # Every chunk is a complete gzip member / zstd frame, so a file cut back
+    # to a checkpoint is always valid and appending continues it.
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def iter_export(path: str, compression: str = None):
+    """Yield the lines of an export (plain, gzip or zstd NDJSON) as dicts, one at a time."""
+    for line in iter_lines(path, compression):
+        yield json.loads(line)
+
+
+def iter_lines(path: str, compression: str = None):
+    """Yield the non-blank lines of a plain, gzip or zstd text file, one at a time."""
+    compression = compression_for(path, compression)
+    if compression == "gzip":
+        stream = gzip.open(path, "rt", encoding="utf-8")
+    elif compression == "zstd":
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        stream = io.TextIOWrapper(reader, encoding="utf-8")
+    else:
+        stream = open(path, encoding="utf-8")
+    with stream:
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+class CampaignExporter:
+    """Streams a whole campaign to an NDJSON file, optionally compressed.
+
+    The file starts with the campaign itself, followed by one line per
+    entity ({"type": "characters", "data": {...}}) and, after each page of
+    entities, one line per post of those entities ({"type": "posts",
+    "entity_type": ..., "entity_id": ..., "data": {...}}).
+
+    Pages are fetched a window at a time through `KankaClient.iter_pages` and
+    written as soon as their posts have arrived, so memory use does not grow
+    with the campaign. Requests run at bulk priority, within the client's
+    per-campaign concurrency limit and rate limit. After every page the file
+    is flushed and a checkpoint (`<path>.checkpoint`) records the position;
+    an interrupted export started again with `resume` continues from there.
+    The checkpoint is removed once the export completes.
+    """
+
+    def __init__(self, client, campaign_id: int, path: str, compression: str = None, entity_types=None,
+                 posts: bool = True):
+        self.client = client
+        self.campaign_id = campaign_id
+        self.path = path
+        self.compression = compression_for(path, compression)
+        self.entity_types = list(entity_types or ENTITY_TYPES)
+        unknown = [entity_type for entity_type in self.entity_types if entity_type not in ENTITY_TYPES]
+        if unknown:
+            raise ValueError(f"Unsupported entity types: {', '.join(unknown)}")
+        self.posts = posts
+        self.checkpoint_path = f"{path}.checkpoint"
+        self.counts = {}
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as file:
+                checkpoint = json.load(file)
+        except FileNotFoundError:
+            return None
+        if not os.path.exists(self.path):
+            return None
+        settings = {"campaign_id": self.campaign_id, "compression": self.compression, "posts": self.posts}
+        if any(checkpoint.get(name) != value for name, value in settings.items()):
+            raise ValueError(
+                f"{self.checkpoint_path} belongs to a different export; delete it or export with resume=False"
+            )
+        return checkpoint
+
+    def _save_checkpoint(self, done: list, entity_type: str, next_page: int, offset: int):
+        checkpoint = {
+            "campaign_id": self.campaign_id,
+            "compression": self.compression,
+            "posts": self.posts,
+            "done": done,
+            "entity_type": entity_type,
+            "next_page": next_page,
+            "offset": offset,
+            "counts": self.counts,
+        }
+        temporary = f"{self.checkpoint_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(checkpoint, file)
+        os.replace(temporary, self.checkpoint_path)
+
+    def _write(self, file, lines: list):
+        data = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+        file.write(_compress(data, self.compression))
+        file.flush()
+        os.fsync(file.fileno())
+
+    async def _entity_posts(self, entity_type: str, entity_id: int) -> list:
+        path = f"campaigns/{self.campaign_id}/entities/{entity_id}/posts"
+        lines = []
+        async for page in self.client.iter_pages(path, use_cache=False, priority=PRIORITY_BULK):
+            lines += [
+                {"type": "posts", "entity_type": entity_type, "entity_id": entity_id, "data": post}
+                for post in page.get("data") or []
+            ]
+        return lines
+
+    async def run(self, resume: bool = True) -> dict:
+        checkpoint = self._load_checkpoint() if resume else None
+        done = []
+        if checkpoint:
+            done = checkpoint["done"]
+            self.counts = checkpoint["counts"]
+            file = open(self.path, "r+b")
+            file.truncate(checkpoint["offset"])
+            file.seek(checkpoint["offset"])
+        else:
+            campaign = await self.client.get(f"campaigns/{self.campaign_id}", priority=PRIORITY_BULK)
+            file = open(self.path, "wb")
+            self._write(file, [{"type": "campaign", "data": campaign.get("data")}])
+        with file:
+            for entity_type in self.entity_types:
+                if entity_type in done:
+                    continue
+                start_page = checkpoint["next_page"] if checkpoint and checkpoint["entity_type"] == entity_type else 1
+                self._save_checkpoint(done, entity_type, start_page, file.tell())
+                path = f"campaigns/{self.campaign_id}/{entity_type}"
+                page_number = start_page
+                async for page in self.client.iter_pages(path, start_page=start_page, use_cache=False, priority=PRIORITY_BULK):
+                    records = page.get("data") or []
+                    lines = [{"type": entity_type, "data": record} for record in records]
+                    if self.posts:
+                        posts = await asyncio.gather(*(
+                            self._entity_posts(entity_type, record["entity_id"])
+                            for record in records if record.get("entity_id")
+                        ))
+                        lines += [line for entity_posts in posts for line in entity_posts]
+                        self.counts["posts"] = self.counts.get("posts", 0) + sum(map(len, posts))
+                    self.counts[entity_type] = self.counts.get(entity_type, 0) + len(records)
+                    self._write(file, lines)
+                    page_number += 1
+                    self._save_checkpoint(done, entity_type, page_number, file.tell())
+                done.append(entity_type)
+            size = file.tell()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.checkpoint_path)
+        return {
+            "path": self.path,
+            "compression": self.compression or "none",
+            "bytes": size,
+            "resumed": checkpoint is not None,
+            "counts": self.counts,
+        }
@@ -0,0 +1,106 @@
+import asyncio
+import httpx
+from kanka_schema import SCHEMAS
+
+# Entity types by their singular name ("character") and Kanka's numeric type_id.
+_BY_SINGULAR = {schema.singular: schema.resource for schema in SCHEMAS.values() if not schema.parent_arg}
+_BY_TYPE_ID = {
+    1: "characters", 2: "families", 3: "locations", 4: "organisations", 5: "items", 6: "notes",
+    7: "events", 8: "calendars", 9: "races", 10: "quests", 11: "journals", 12: "tags",
+    16: "abilities", 17: "maps", 18: "timelines", 20: "creatures",
+}
+# Fields holding the ID of an entity (rather than of a typed object).
+ENTITY_REFERENCE_FIELDS = ("author_id",)
+
+
+def node_key(entity_type: str, object_id: int) -> str:
+    return f"{entity_type}:{object_id}"
+
+
+def references(record: dict) -> list:
+    """Return the (field, entity_type, object_id) references of a record.
+
+    Typed references are `<type>_id` fields and lists named after a type
+    (`"races": [1, 2]`). References to entities, such as relation targets and
+    journal authors, use the entity type "entities" and the entity ID.
+    """
+    found = []
+    for field, value in record.items():
+        if field in ENTITY_REFERENCE_FIELDS and isinstance(value, int):
+            found.append((field, "entities", value))
+        elif field.endswith("_id") and field[:-3] in _BY_SINGULAR and isinstance(value, int):
+            found.append((field, _BY_SINGULAR[field[:-3]], value))
+        elif field in SCHEMAS and isinstance(value, list):
+            found.extend((field, field, item) for item in value if isinstance(item, int))
+    for relation in record.get("relations") or []:
+        if isinstance(relation, dict) and isinstance(relation.get("target_id"), int):
+            found.append((relation.get("relation") or "relation", "entities", relation["target_id"]))
+    return found
+
+
+class EntityGraph:
+    """Fetches an entity together with the entities it references.
+
+    Each level of references is fetched concurrently; an entity reached
+    through several paths is fetched once. Nodes are requested with
+    `related=1` so Kanka includes their posts and relations in the same
+    response.
+    """
+
+    def __init__(self, client, campaign_id: int):
+        self.client = client
+        self.campaign_id = campaign_id
+        self.nodes = {}
+        self.edges = []
+        self.missing = []
+        self._entity_keys = {}
+
+    async def _resolve_entity(self, entity_id: int):
+        """Map an entity ID to the (entity_type, object_id) of its child object."""
+        if entity_id not in self._entity_keys:
+            result = await self.client.get(f"campaigns/{self.campaign_id}/entities/{entity_id}")
+            data = result.get("data") or {}
+            entity_type = _BY_SINGULAR.get(data.get("type")) or _BY_TYPE_ID.get(data.get("type_id"))
+            if entity_type is None or data.get("child_id") is None:
+                raise LookupError(f"entity {entity_id} has no supported type")
+            self._entity_keys[entity_id] = (entity_type, data["child_id"])
+        return self._entity_keys[entity_id]
+
+    async def _fetch(self, entity_type: str, object_id: int):
+        if entity_type == "entities":
+            entity_type, object_id = await self._resolve_entity(object_id)
+        key = node_key(entity_type, object_id)
+        if key not in self.nodes:
+            path = f"campaigns/{self.campaign_id}/{entity_type}/{object_id}"
+            result = await self.client.get(path, {"related": 1})
+            self.nodes[key] = result["data"]
+        return key
+
+    async def build(self, entity_type: str, object_id: int, depth: int = 1) -> dict:
+        root = await self._fetch(entity_type, object_id)
+        frontier = [root]
+        expanded = {root}
+        for _ in range(depth):
+            pending = {}
+            for source in frontier:
+                for field, ref_type, ref_id in references(self.nodes[source]):
+                    pending.setdefault((ref_type, ref_id), []).append((source, field))
+            if not pending:
+                break
+            targets = list(pending)
+            results = await asyncio.gather(
+                *(self._fetch(ref_type, ref_id) for ref_type, ref_id in targets), return_exceptions=True
+            )
+            frontier = []
+            for target, result in zip(targets, results):
+                if isinstance(result, (httpx.HTTPStatusError, LookupError)):
+                    self.missing.append({"ref": node_key(*target), "error": str(result).splitlines()[0]})
+                    continue
+                if isinstance(result, BaseException):
+                    raise result
+                for source, field in pending[target]:
+                    self.edges.append({"from": source, "field": field, "to": result})
+                if result not in expanded:
+                    expanded.add(result)
+                    frontier.append(result)
+        return {"root": root, "nodes": self.nodes, "edges": self.edges, "missing": self.missing}
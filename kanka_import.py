@@ -0,0 +1,421 @@
+import asyncio
+import csv
+import gzip
+import json
+import os
+from typing import NamedTuple
+import httpx
+from kanka_export import iter_lines
+from kanka_ratelimit import PRIORITY_BULK
+from kanka_resolver import normalize
+from kanka_schema import ENTITY_TYPES, SCHEMAS, wrap_html
+from kanka_search import strip_html
+
+_TRUE = ("1", "true", "yes", "y")
+_FALSE = ("0", "false", "no", "n")
+
+# Operations listed in a result; the counts always cover every row.
+MAX_LISTED_OPERATIONS = 100
+
+
+class UnreadableRow(NamedTuple):
+    """Stands in for an NDJSON line that is not valid JSON."""
+    error: str
+
+
+def iter_rows(path: str):
+    """Yield the rows of an NDJSON (optionally .gz / .zst) or CSV (optionally .gz) file one at a time.
+
+    NDJSON lines that do not parse are yielded as `UnreadableRow`s, so the
+    rows around them can still be imported.
+    """
+    name = path[:-3] if path.endswith(".gz") else path
+    if os.path.splitext(name)[1].lower() != ".csv":
+        for line in iter_lines(path):
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                yield UnreadableRow(f"invalid JSON: {error}")
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8-sig", newline="") as file:
+        yield from csv.DictReader(file)
+
+
+def coerce(field, value):
+    """Convert a file value (CSV cells are strings) to the field's type; empty values become None."""
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        if field.type is int:
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError(f"{field.name} must be an integer") from None
+        if field.type is bool:
+            if value.lower() in _TRUE:
+                return True
+            if value.lower() in _FALSE:
+                return False
+            raise ValueError(f"{field.name} must be a boolean")
+        if field.type in (list, dict):
+            if value[0] in "[{":
+                return json.loads(value)
+            if field.type is list:
+                return [item.strip() for item in value.split(",") if item.strip()]
+            raise ValueError(f"{field.name} must be a JSON object")
+    if field.type is int and isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _same(field, old, new) -> bool:
+    if field.html:
+        return strip_html(old) == strip_html(new)
+    if isinstance(old, list) and isinstance(new, list):
+        return sorted(map(str, old)) == sorted(map(str, new))
+    return old == new
+
+
+def desired_values(schema, row: dict, create: bool) -> dict:
+    """The Kanka payload a row asks for, keyed by API field, with only the fields it sets."""
+    values = {}
+    for field in schema.fields:
+        if field.key is None or (create and not field.on_create):
+            continue
+        value = coerce(field, row.get(field.name, row.get(field.key)))
+        if value is not None:
+            values[field.key] = wrap_html(value) if field.html and isinstance(value, str) else value
+    if create and not values.get("name"):
+        raise ValueError(f"name is required to create a {schema.singular}")
+    return values
+
+
+def changes(schema, record: dict, values: dict) -> dict:
+    """The subset of `values` that differs from the existing record."""
+    fields = {field.key: field for field in schema.fields if field.key is not None}
+    return {key: value for key, value in values.items() if not _same(fields[key], record.get(key), value)}
+
+
+class Operation(NamedTuple):
+    row: int
+    action: str
+    entity_type: str
+    schema: object
+    path: str
+    payload: dict
+    name: str
+    object_id: int = None
+    parent_id: int = None
+
+    def describe(self) -> dict:
+        described = {"row": self.row, "action": self.action, "entity_type": self.entity_type, "name": self.name}
+        if self.object_id is not None:
+            described["id"] = self.object_id
+        if self.action.startswith("update"):
+            described["changes"] = sorted(self.payload)
+        return described
+
+
+def _name(record: dict):
+    name = record.get("name")
+    return name.strip() if isinstance(name, str) else name
+
+
+class _Existing:
+    """Entities (or posts) already in the campaign, by ID, name and external key.
+
+    Writes not yet sent are kept in `pending` by ID, so later rows naming
+    the same entity fold into them; creates get a placeholder record with
+    the negated row number as ID.
+    """
+
+    def __init__(self, key: str = None):
+        self.key = key
+        self.records = {}
+        self.by_name = {}
+        self.by_key = {}
+        self.pending = {}
+        self.original = {}
+
+    def add(self, record: dict):
+        # A copy: fetched records may be shared with the cache and stores, and planning changes them.
+        record = dict(record)
+        self.records[record["id"]] = record
+        self.by_name.setdefault(normalize(record.get("name")), set()).add(record["id"])
+        if self.key and record.get(self.key) is not None:
+            self.by_key[str(record[self.key])] = record["id"]
+        return record
+
+    def remove(self, object_id: int):
+        record = self.records.pop(object_id, None)
+        self.pending.pop(object_id, None)
+        if record is None:
+            return
+        ids = self.by_name.get(normalize(record.get("name")), set())
+        ids.discard(object_id)
+        if self.key and self.by_key.get(str(record.get(self.key))) == object_id:
+            del self.by_key[str(record[self.key])]
+
+    def match(self, row: dict, name: str):
+        """Return the existing record a row refers to, or None for a new entity."""
+        if self.key and row.get(self.key) not in (None, ""):
+            object_id = self.by_key.get(str(row[self.key]).strip())
+            if object_id is not None:
+                return self.records[object_id]
+        ids = self.by_name.get(normalize(name), ()) if name else ()
+        if len(ids) > 1:
+            raise ValueError(f'name "{name}" matches {len(ids)} existing entries; add a {self.key or "key"} to tell them apart')
+        return self.records[next(iter(ids))] if ids else None
+
+
+class CampaignImporter:
+    """Imports entity rows from an NDJSON or CSV file into a campaign, sending only what changed.
+
+    Rows are plain records (CSV columns or JSON keys named like the fields
+    of the create_* tools, plus an `entity_type` column when the file mixes
+    types) or the lines of an `export_campaign` file. Each row is matched to
+    an existing entity of its type by `key` (e.g. "id") when the row has
+    one, and otherwise by name. Matched rows are updated with only the
+    fields that differ, unmatched rows are created and identical rows are
+    skipped. Posts (a `posts` list on a row, or the post lines of an export)
+    are matched by name among the entity's posts the same way.
+
+    The file is read in batches; each batch's writes are sent concurrently
+    at bulk priority within the client's rate limit. With `dry_run` nothing
+    is written and the planned operations and their request cost are
+    returned instead.
+    """
+
+    def __init__(self, client, campaign_id: int, entity_type: str = None, key: str = None, dry_run: bool = False,
+                 batch_size: int = 50):
+        if entity_type is not None and entity_type not in ENTITY_TYPES:
+            raise ValueError(f"Unsupported entity type: {entity_type}")
+        self.client = client
+        self.campaign_id = campaign_id
+        self.entity_type = entity_type
+        self.key = key
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self._existing = {}
+        # Entity IDs of exported entities, mapped to the entities they are imported as.
+        self._entity_ids = {}
+        # Entity IDs of created entities by ("row", number).
+        self._created = {}
+        self.counts = {}
+        self.operations = []
+        self.errors = []
+
+    def _count(self, action: str):
+        self.counts[action] = self.counts.get(action, 0) + 1
+
+    def _error(self, row: int, error):
+        self._count("errors")
+        if isinstance(error, httpx.HTTPStatusError):
+            error = f"{error.response.status_code}: {error.response.text[:300]}"
+        elif isinstance(error, Exception) and not isinstance(error, ValueError):
+            error = f"{type(error).__name__}: {error}"
+        self.errors.append({"row": row, "error": str(error)})
+
+    async def _existing_of(self, entity_type: str) -> _Existing:
+        existing = self._existing.get(entity_type)
+        if existing is None:
+            existing = _Existing(self.key)
+            path = f"campaigns/{self.campaign_id}/{entity_type}"
+            async for page in self.client.iter_pages(path, use_cache=False, priority=PRIORITY_BULK):
+                for record in page.get("data") or []:
+                    existing.add(record)
+            self._existing[entity_type] = existing
+        return existing
+
+    def _plan(self, number: int, schema, existing: _Existing, record: dict, parent_id=None):
+        """Plan the write one row needs; returns the operation (or None) and the record it targets."""
+        if not isinstance(record, dict):
+            raise ValueError(f"a {schema.singular} must be an object")
+        if record.get("name") is not None and not isinstance(record["name"], str):
+            raise ValueError("name must be a string")
+        action = "create" if schema.parent_arg is None else "create_post"
+        match = existing.match(record, _name(record))
+        if match is None:
+            values = desired_values(schema, record, create=True)
+            path = schema.path(self.campaign_id, parent_id)
+            operation = Operation(number, action, schema.resource, schema, path, values, values["name"], None, parent_id)
+            placeholder = existing.add({**values, "id": -number})
+            existing.pending[-number] = operation
+            return operation, placeholder
+        diff = changes(schema, match, desired_values(schema, record, create=False))
+        pending = existing.pending.get(match["id"])
+        if pending is None and diff and match["id"] > 0:
+            existing.original[match["id"]] = dict(match)
+        # Later rows are compared with the state earlier rows asked for.
+        match.update(diff)
+        if pending is not None:
+            # The same entity as an earlier row of this batch: fold the changes into its write.
+            pending.payload.update(diff)
+            if match["id"] > 0:
+                net = changes(schema, existing.original[match["id"]], pending.payload)
+                pending.payload.clear()
+                pending.payload.update(net)
+            self._count("merged")
+            return None, match
+        if not diff:
+            self._count("unchanged" if schema.parent_arg is None else "unchanged_posts")
+            return None, match
+        path = schema.path(self.campaign_id, parent_id, match["id"])
+        action = action.replace("create", "update")
+        operation = Operation(number, action, schema.resource, schema, path, diff, match.get("name"), match["id"], parent_id)
+        existing.pending[match["id"]] = operation
+        return operation, match
+
+    def _split(self, row: dict):
+        """Return (entity type, record, exported entity ID) of a row."""
+        if not isinstance(row, dict):
+            raise ValueError("a row must be an object")
+        if isinstance(row.get("data"), dict) and "type" in row:
+            return row["type"], row["data"], row.get("entity_id")
+        posts = row.get("posts")
+        if posts not in (None, "") and not (isinstance(posts, list) and all(isinstance(post, dict) for post in posts)):
+            raise ValueError("posts must be a list of objects")
+        record = {name: value for name, value in row.items() if name != "entity_type"}
+        return row.get("entity_type") or self.entity_type, record, None
+
+    async def _send(self, operations: list) -> list:
+        async def send(operation):
+            if operation.action.startswith("create"):
+                payload = operation.payload
+                if operation.schema.parent_arg:
+                    payload = {**payload, operation.schema.parent_arg: operation.parent_id}
+                result = await self.client.post(operation.path, payload, priority=PRIORITY_BULK)
+            else:
+                result = await self.client.patch(operation.path, operation.payload, priority=PRIORITY_BULK)
+            return result.get("data") or {}
+
+        results = await asyncio.gather(*(send(operation) for operation in operations), return_exceptions=True)
+        for operation, result in zip(operations, results):
+            if isinstance(result, Exception):
+                self._error(operation.row, result)
+        return results
+
+    def _record(self, operations: list):
+        for operation in operations:
+            self._count(operation.action)
+            if len(self.operations) < MAX_LISTED_OPERATIONS:
+                self.operations.append(operation.describe())
+
+    async def _posts_of(self, entity_id: int) -> _Existing:
+        existing = _Existing()
+        if entity_id is not None:
+            path = f"campaigns/{self.campaign_id}/entities/{entity_id}/posts"
+            async for page in self.client.iter_pages(path, use_cache=False, priority=PRIORITY_BULK):
+                for post in page.get("data") or []:
+                    existing.add(post)
+        return existing
+
+    async def _run_batch(self, batch: list):
+        entity_operations = []
+        post_rows = {}
+        for number, row in batch:
+            try:
+                entity_type, record, exported_entity_id = self._split(row)
+                if entity_type == "campaign":
+                    continue
+                if entity_type == "posts":
+                    if exported_entity_id not in self._entity_ids:
+                        raise ValueError(f"post of entity {exported_entity_id}, which is not in the file")
+                    post_rows.setdefault(self._entity_ids[exported_entity_id], []).append((number, record))
+                    continue
+                if entity_type not in ENTITY_TYPES:
+                    raise ValueError(f"unknown entity type {entity_type!r}; set entity_type or add an entity_type column")
+                existing = await self._existing_of(entity_type)
+                operation, target = self._plan(number, SCHEMAS[entity_type], existing, record)
+            except Exception as error:
+                # A bad row is reported and skipped; the rest of the file is still imported.
+                self._error(number, error)
+                continue
+            if operation is not None:
+                entity_operations.append(operation)
+            # Posts of an entity that is yet to be created are held under its row.
+            parent = target["entity_id"] if target["id"] > 0 else ("row", -target["id"])
+            if record.get("entity_id") is not None:
+                self._entity_ids[record["entity_id"]] = parent
+            if record.get("posts"):
+                post_rows.setdefault(parent, []).extend((number, post) for post in record["posts"])
+
+        # Rows that undo each other's changes leave nothing to send.
+        for operation in [operation for operation in entity_operations if not operation.payload]:
+            entity_operations.remove(operation)
+            self._existing[operation.entity_type].pending.pop(operation.object_id, None)
+            self._count("unchanged")
+        self._record(entity_operations)
+        if not self.dry_run:
+            results = await self._send(entity_operations)
+            for operation, result in zip(entity_operations, results):
+                existing = self._existing[operation.entity_type]
+                if operation.action == "create":
+                    existing.remove(-operation.row)
+                else:
+                    existing.pending.pop(operation.object_id, None)
+                    existing.original.pop(operation.object_id, None)
+                if isinstance(result, Exception):
+                    continue
+                if result.get("id") is not None:
+                    existing.remove(result["id"])
+                    existing.add(result)
+                if operation.action == "create":
+                    self._created[("row", operation.row)] = result.get("entity_id")
+
+        post_operations = []
+        for parent, rows in post_rows.items():
+            entity_id = self._created.get(parent, parent)
+            if isinstance(entity_id, tuple) and not self.dry_run:
+                for number, _ in rows:
+                    self._error(number, f"the entity of row {entity_id[1]} was not created, so its posts were skipped")
+                continue
+            entity_id = entity_id if isinstance(entity_id, int) else None
+            existing = await self._posts_of(entity_id)
+            for number, post in rows:
+                try:
+                    operation, _ = self._plan(number, SCHEMAS["posts"], existing, post, entity_id)
+                except Exception as error:
+                    self._error(number, error)
+                    continue
+                if operation is not None:
+                    post_operations.append(operation)
+        self._record(post_operations)
+        if not self.dry_run:
+            await self._send(post_operations)
+
+    async def run(self, path: str) -> dict:
+        sent = self.client.requests_sent
+        rows = 0
+        batch = []
+        for rows, row in enumerate(iter_rows(path), start=1):
+            if isinstance(row, UnreadableRow):
+                self._error(rows, row.error)
+                continue
+            batch.append((rows, row))
+            if len(batch) >= self.batch_size:
+                await self._run_batch(batch)
+                batch = []
+        if batch:
+            await self._run_batch(batch)
+        writes = sum(count for action, count in self.counts.items() if action.startswith(("create", "update")))
+        result = {
+            "dry_run": self.dry_run,
+            "rows": rows,
+            "counts": self.counts,
+            "operations": self.operations,
+            "errors": self.errors,
+        }
+        if len(self.operations) < writes:
+            result["operations_listed"] = len(self.operations)
+        if self.dry_run:
+            result["cost"] = {
+                "read_requests": self.client.requests_sent - sent,
+                "write_requests": writes,
+                "estimated_seconds": round(writes * 60 / self.client.limiter.per_minute, 1),
+            }
+        else:
+            result["requests_sent"] = self.client.requests_sent - sent
+        return result
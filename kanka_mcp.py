@@ -1,700 +1,658 @@
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import inspect
 import os
-import requests
+import weakref
+from functools import cached_property
+import httpx
 from mcp.server.fastmcp import FastMCP
-
-mcp = FastMCP("kanka")
+from mcp.server.fastmcp.tools import Tool
+from mcp.server.fastmcp.utilities.func_metadata import func_metadata
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from kanka_metrics import metrics
+from kanka_schema import (
+    SCHEMAS, build_create_tool, build_delete_tool, build_get_tool, build_list_tool, build_update_tool,
+)
+
+_JSON_TYPES = {
+    int: {"type": "integer"},
+    float: {"type": "number"},
+    str: {"type": "string"},
+    bool: {"type": "boolean"},
+    list: {"items": {}, "type": "array"},
+    dict: {"additionalProperties": True, "type": "object"},
+}
+
+def arguments_schema(fn):
+    """JSON schema of a tool's arguments read from its signature, as FastMCP would build it.
+    Returns None when the signature uses anything but plain parameters of the types above."""
+    signature = inspect.signature(fn)
+    if signature.return_annotation is not inspect.Signature.empty:
+        return None
+    properties = {}
+    required = []
+    for parameter in signature.parameters.values():
+        json_type = _JSON_TYPES.get(parameter.annotation)
+        if json_type is None or parameter.kind not in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY):
+            return None
+        title = {"title": parameter.name.replace("_", " ").title()}
+        if parameter.default is parameter.empty:
+            required.append(parameter.name)
+            properties[parameter.name] = {**title, **json_type}
+        else:
+            properties[parameter.name] = {"default": parameter.default, **title, **json_type}
+    schema = {"properties": properties}
+    if required:
+        schema["required"] = required
+    return {**schema, "title": f"{fn.__name__}Arguments", "type": "object"}
+
+# Tool fields a LazyTool is built with; other mcp releases register tools the regular way.
+_LAZY_FIELDS = {"fn", "name", "description", "parameters", "fn_metadata", "is_async", "context_kwarg"}
+
+class LazyTool(Tool):
+    """Tool whose pydantic argument model is only built when it is first called.
+    Building the models of every tool up front made up a large part of startup."""
+
+    @cached_property
+    def output_schema(self):
+        return None
+
+    async def run(self, arguments, context=None, convert_result=False):
+        if self.fn_metadata is None:
+            self.fn_metadata = func_metadata(self.fn)
+        return await super().run(arguments, context=context, convert_result=convert_result)
+
+class KankaMCP(FastMCP):
+    """FastMCP server that measures every tool call and registers tools lazily."""
+
+    def add_tool(self, fn, name=None, description=None, **options):
+        # Options are passed on by keyword, as add_tool's parameters differ between mcp releases.
+        parameters = arguments_schema(fn)
+        tools = getattr(getattr(self, "_tool_manager", None), "_tools", None)
+        lazy = (
+            parameters is not None
+            and not options.get("structured_output")
+            and isinstance(tools, dict)
+            and _LAZY_FIELDS <= set(Tool.model_fields)
+            and all(option in Tool.model_fields for option, value in options.items() if value is not None)
+        )
+        if not lazy:
+            return super().add_tool(fn, name=name, description=description, **options)
+        tool = LazyTool.model_construct(
+            fn=fn,
+            name=name or fn.__name__,
+            description=description or fn.__doc__ or "",
+            parameters=parameters,
+            fn_metadata=None,
+            is_async=inspect.iscoroutinefunction(fn),
+            context_kwarg=None,
+            **{option: value for option, value in options.items() if option in Tool.model_fields},
+        )
+        # The tool manager only builds tools from functions itself.
+        tools[tool.name] = tool
+
+    async def call_tool(self, name, arguments):
+        held = set()
+        token = _held_workspaces.set(held)
+        try:
+            with metrics.tool_call(name):
+                return await super().call_tool(name, arguments)
+        finally:
+            _held_workspaces.reset(token)
+            for workspace in held:
+                workspace.release()
+
+mcp = KankaMCP("kanka")
+
+def _http_request():
+    """Return the HTTP request of the current tool call, or None (e.g. over stdio)."""
+    try:
+        request_context = mcp.get_context().request_context
+    except ValueError:
+        return None
+    return getattr(request_context, "request", None)
 
 def get_api_key():
+    """Return the Kanka API key for the current tool call.
+
+    Over HTTP the key is taken from the request's `X-Kanka-Api-Key` header or
+    its `Authorization: Bearer` token, or else from the last one its session
+    sent. KANKA_API_KEY is only used over HTTP when KANKA_HTTP_SHARED_KEY=1
+    opts in, since it gives every client that can reach the port the
+    operator's account; over stdio it is the key.
+    """
+    request = _http_request()
+    if request is not None:
+        api_key = request.headers.get("x-kanka-api-key")
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if not api_key and scheme.lower() == "bearer":
+            api_key = token.strip()
+        session = mcp.get_context().session
+        if api_key:
+            _session_keys[session] = api_key
+            return api_key
+        if session in _session_keys:
+            return _session_keys[session]
+        if os.getenv("KANKA_HTTP_SHARED_KEY") != "1":
+            raise EnvironmentError("No Kanka API key: send an X-Kanka-Api-Key or Authorization: Bearer header.")
     api_key = os.getenv("KANKA_API_KEY")
     if not api_key:
+        if request is not None:
+            raise EnvironmentError("No Kanka API key: send an X-Kanka-Api-Key or Authorization: Bearer header.")
         raise EnvironmentError("KANKA_API_KEY environment variable not set.")
     return api_key
 
-api_key = get_api_key()
-
-KANKA_API_URL = "https://api.kanka.io/1.0/campaigns"
-
-def get_headers():
-    return {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
+# Fields kept by compact mode, and the length of its plain-text entry excerpt.
+COMPACT_FIELDS = ("id", "entity_id", "name", "type")
+COMPACT_ENTRY_LENGTH = 200
+
+def shape_record(record: dict, fields: list = None, compact: bool = False) -> dict:
+    """Project one entity to the requested fields and/or its compact summary."""
+    keys = fields or (COMPACT_FIELDS + ("entry",) if compact else None)
+    if keys is None:
+        return record
+    shaped = {key: record[key] for key in keys if key in record}
+    if compact and shaped.get("entry"):
+        from kanka_search import strip_html
+        text = strip_html(shaped["entry"])
+        if len(text) > COMPACT_ENTRY_LENGTH:
+            text = text[:COMPACT_ENTRY_LENGTH].rstrip() + "..."
+        shaped["entry"] = text
+    return shaped
+
+def shape_records(records: list, fields: list = None, compact: bool = False) -> list:
+    if not fields and not compact:
+        return records
+    return [shape_record(record, fields, compact) for record in records]
+
+def shape_response(result: dict, fields: list = None, compact: bool = False) -> dict:
+    """Apply field projection / compact mode to a get or list response.
+
+    A new response is built, so cached responses are never modified.
+    """
+    if not fields and not compact:
+        return result
+    data = result.get("data")
+    if isinstance(data, list):
+        data = shape_records(data, fields, compact)
+    elif isinstance(data, dict):
+        data = shape_record(data, fields, compact)
+    return {**result, "data": data}
+
+# One workspace per API key, so keys never share a pool, cache or rate limit.
+# Created on first use: the client, stores, search index and export/import
+# modules are only imported by the tools that need them, so starting up and
+# listing tools loads little beyond mcp (which brings httpx with it).
+_registry = None
+# Workspaces used by the running tool call.
+_held_workspaces = contextvars.ContextVar("held_workspaces", default=None)
+# API keys sent by each HTTP session, used by its requests that carry none.
+_session_keys = weakref.WeakKeyDictionary()
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        from kanka_registry import WorkspaceRegistry
+        _registry = WorkspaceRegistry()
+    return _registry
+
+def get_workspace():
+    """Return the workspace of the current API key, held open until the tool call returns."""
+    workspace = get_registry().get(get_api_key())
+    held = _held_workspaces.get()
+    if held is not None and workspace not in held:
+        held.add(workspace)
+        workspace.acquire()
+    return workspace
+
+def get_client():
+    """Return the pooled client all tools of the current API key send their requests through."""
+    return get_workspace().client
+
+def get_writer():
+    """Return what update tools send their writes through: the write-behind queue when enabled, else the client."""
+    workspace = get_workspace()
+    return workspace.write_queue or workspace.client
+
+def get_search_index():
+    """Return the full-text index fed by the current client."""
+    return get_workspace().search_index
+
+def get_sync_engine():
+    """Return the sync engine keeping the local campaign store up to date."""
+    return get_workspace().sync_engine
 
 @mcp.tool()
-def show_campaigns():
+async def show_campaigns(
+    fields: list = None,  # Only return these fields of each campaign (optional)
+    compact: bool = False # Return short summaries with a plain-text entry excerpt (optional)
+):
     """List all campaigns the user has access to.
-    You may need to run this tool before running other tools to get the campaign ID."""
-    response = requests.get(KANKA_API_URL, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
-
-@mcp.tool()
-def list_characters(campaign_id: int):
-    """List all characters in a campaign."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/characters"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
-
-@mcp.tool()
-def get_character(campaign_id: int, character_id: int):
-    """Get a single character by ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/characters/{character_id}"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+    You may need to run this tool before running other tools to get the campaign ID.
+    Fields:
+        fields: Only return these fields of each campaign, e.g. ["id", "name"] (optional)
+        compact: Return short summaries (id, name and a plain-text entry excerpt) (optional)
+    """
+    return shape_response(await get_client().get("campaigns"), fields, compact)
 
 @mcp.tool()
-def create_character(
-    campaign_id: int,  # The ID of the campaign to add the character to
-    name: str,         # The name of the character (required)
-    title: str = None, # The character's title (optional)
-    type: str = None,  # The type or class of the character (optional)
-    age: str = None,   # The age of the character (optional)
-    sex: str = None,   # The sex/gender of the character (optional)
-    pronouns: str = None, # The pronouns of the character (optional)
-    race_id: int = None,  # The ID of the race entity (optional)
-    family_id: int = None, # The ID of the family entity (optional)
-    is_dead: bool = None,  # Whether the character is dead (optional)
-    image: str = None,     # URL or path to the character's image (optional)
-    tags: str = None,      # Comma-separated list of tags (optional)
-    entry: str = None,     # # The character's entry/description (optional, must be HTML)
-    is_private: bool = None # If the character is only visible to admin members (optional)
+async def sync_campaign(
+    campaign_id: int,          # The ID of the campaign to sync
+    entity_types: list = None, # Entity types to sync (optional, defaults to characters, locations, notes and journals)
+    full: bool = False         # Re-list everything instead of fetching only changes (optional)
 ):
-    """Create a new character in a campaign.
+    """Sync a campaign's entities into the local store.
+    The first sync lists everything; later syncs only fetch entities changed since the previous sync.
     Fields:
-        campaign_id: The ID of the campaign to add the character to
-        name: The name of the character (required)
-        title: The character's title (optional)
-        type: The type or class of the character (optional)
-        age: The age of the character (optional)
-        sex: The sex/gender of the character (optional)
-        pronouns: The pronouns of the character (optional)
-        race_id: The ID of the race entity (optional)
-        family_id: The ID of the family entity (optional)
-        is_dead: Whether the character is dead (optional)
-        image: URL or path to the character's image (optional)
-        tags: Comma-separated list of tags (optional)
-        entry: The character's entry/description (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        is_private: If the character is only visible to admin members (optional)
+        campaign_id: The ID of the campaign to sync
+        entity_types: Entity types to sync (optional, defaults to characters, locations, notes and journals)
+        full: Re-list everything instead of fetching only changes; also drops entities deleted in Kanka (optional)
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/characters"
-    data = {"name": name}
-    if title is not None:
-        data["title"] = title
-    if type is not None:
-        data["type"] = type
-    if age is not None:
-        data["age"] = age
-    if sex is not None:
-        data["sex"] = sex
-    if pronouns is not None:
-        data["pronouns"] = pronouns
-    if race_id is not None:
-        data["race_id"] = race_id
-    if family_id is not None:
-        data["family_id"] = family_id
-    if is_dead is not None:
-        data["is_dead"] = is_dead
-    if image is not None:
-        data["image"] = image
-    if tags is not None:
-        data["tags"] = tags
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if is_private is not None:
-        data["is_private"] = is_private
-    response = requests.post(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
+    return await get_sync_engine().sync(campaign_id, entity_types, full)
 
 @mcp.tool()
-def update_character(
-    campaign_id: int,      # The ID of the campaign
-    character_id: int,     # The ID of the character to update
-    name: str = None,      # The name of the character (optional)
-    title: str = None,     # The character's title (optional)
-    type: str = None,      # The type or class of the character (optional)
-    age: str = None,       # The age of the character (optional)
-    sex: str = None,       # The sex/gender of the character (optional)
-    pronouns: str = None,  # The pronouns of the character (optional)
-    race_id: int = None,   # The ID of the race entity (optional)
-    family_id: int = None, # The ID of the family entity (optional)
-    is_dead: bool = None,  # Whether the character is dead (optional)
-    image: str = None,     # URL or path to the character's image (optional)
-    tags: str = None,      # Comma-separated list of tags (optional)
-    entry: str = None,     # The character's entry/description (optional, must be HTML)
-    is_private: bool = None # If the character is only visible to admin members (optional)
+async def list_changed_since(
+    campaign_id: int,          # The ID of the campaign
+    since: str,                # ISO timestamp or date, e.g. 2024-05-01T12:00:00Z
+    entity_types: list = None, # Entity types to check (optional, defaults to characters, locations, notes and journals)
+    refresh: bool = True,      # Sync changes from Kanka before answering (optional)
+    fields: list = None,       # Only return these fields of each result (optional)
+    compact: bool = False      # Return short summaries with a plain-text entry excerpt (optional)
 ):
-    """Update an existing character.
+    """List entities changed since a given time.
     Fields:
         campaign_id: The ID of the campaign
-        character_id: The ID of the character to update
-        name: The name of the character (optional)
-        title: The character's title (optional)
-        type: The type or class of the character (optional)
-        age: The age of the character (optional)
-        sex: The sex/gender of the character (optional)
-        pronouns: The pronouns of the character (optional)
-        race_id: The ID of the race entity (optional)
-        family_id: The ID of the family entity (optional)
-        is_dead: Whether the character is dead (optional)
-        image: URL or path to the character's image (optional)
-        tags: Comma-separated list of tags (optional)
-        entry: The character's entry/description (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        is_private: If the character is only visible to admin members (optional)
+        since: ISO timestamp or date, e.g. 2024-05-01T12:00:00Z
+        entity_types: Entity types to check (optional, defaults to characters, locations, notes and journals)
+        refresh: Sync changes from Kanka before answering; set to false to answer from the local store only (optional)
+        fields: Only return these fields of each result, e.g. ["id", "name", "updated_at"] (optional)
+        compact: Return short summaries (id, entity_id, name, type and a plain-text entry excerpt) (optional)
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/characters/{character_id}"
-    data = {}
-    if name is not None:
-        data["name"] = name
-    if title is not None:
-        data["title"] = title
-    if type is not None:
-        data["type"] = type
-    if age is not None:
-        data["age"] = age
-    if sex is not None:
-        data["sex"] = sex
-    if pronouns is not None:
-        data["pronouns"] = pronouns
-    if race_id is not None:
-        data["race_id"] = race_id
-    if family_id is not None:
-        data["family_id"] = family_id
-    if is_dead is not None:
-        data["is_dead"] = is_dead
-    if image is not None:
-        data["image"] = image
-    if tags is not None:
-        data["tags"] = tags
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if is_private is not None:
-        data["is_private"] = is_private
-    response = requests.put(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
-
-@mcp.tool()
-def delete_character(campaign_id: int, character_id: int):
-    """Delete a character by ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/characters/{character_id}"
-    response = requests.delete(url, headers=get_headers())
-    if response.status_code == 204:
-        return {"success": True}
-    response.raise_for_status()
-    return {"success": False, "error": response.text}
-
-@mcp.tool()
-def list_locations(campaign_id: int):
-    """List all locations in a campaign."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/locations"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
-
-@mcp.tool()
-def get_location(campaign_id: int, location_id: int):
-    """Get a single location by ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/locations/{location_id}"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+    from kanka_sync import SYNC_TYPES
+    engine = get_sync_engine()
+    entity_types = entity_types or SYNC_TYPES
+    if refresh:
+        await engine.sync(campaign_id, entity_types)
+    changes = engine.store.changed_since(campaign_id, since, entity_types)
+    return {
+        entity_type: shape_records(records, fields, compact)
+        for entity_type, records in changes.items()
+    }
 
 @mcp.tool()
-def create_location(
-    campaign_id: int,  # The ID of the campaign to add the location to
-    name: str,         # The name of the location (required)
-    entry: str = None, # The location's entry/description (optional, must be HTML)
-    type: str = None,  # Type of location (optional)
-    location_id: int = None, # The parent location id (optional)
-    tags: list = None, # Array of tag ids (optional)
-    is_destroyed: bool = None, # If the location is destroyed (optional)
-    is_private: bool = None    # If the location is only visible to admin members (optional)
+async def search_campaign(
+    campaign_id: int,          # The ID of the campaign to search
+    query: str,                # Free-text query, e.g. "blacksmith northern city"
+    entity_types: list = None, # Restrict to these types, e.g. ["characters", "locations"] (optional)
+    limit: int = 20,           # Maximum number of results (optional)
+    refresh: bool = False      # Sync changes from Kanka before searching (optional)
 ):
-    """Create a new location in a campaign.
+    """Search a campaign's entities and posts by name, type, tags and entry text.
+    Results are ranked best first and include a snippet of the matching entry text.
+    The search runs on a local index that is kept current by the other tools and by sync_campaign;
+    a campaign that has not been indexed yet is synced first.
     Fields:
-        campaign_id: The ID of the campaign to add the location to
-        name: The name of the location (required)
-        entry: The location's entry/description (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        type: Type of location (optional)
-        location_id: The parent location id (optional)
-        tags: Array of tag ids (optional)
-        is_destroyed: If the location is destroyed (optional)
-        is_private: If the location is only visible to admin members (optional)
+        campaign_id: The ID of the campaign to search
+        query: Free-text query, e.g. "blacksmith northern city"
+        entity_types: Restrict to these types, e.g. ["characters", "locations"] (optional)
+        limit: Maximum number of results (optional, default 20)
+        refresh: Sync changes from Kanka before searching (optional)
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/locations"
-    data = {"name": name}
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if type is not None:
-        data["type"] = type
-    if location_id is not None:
-        data["location_id"] = location_id
-    if tags is not None:
-        data["tags"] = tags
-    if is_destroyed is not None:
-        data["is_destroyed"] = is_destroyed
-    if is_private is not None:
-        data["is_private"] = is_private
-    response = requests.post(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
+    index = get_search_index()
+    if refresh or not index.count(campaign_id):
+        await get_sync_engine().sync(campaign_id)
+    return {"results": index.search(campaign_id, query, entity_types, limit)}
 
 @mcp.tool()
-def update_location(
-    campaign_id: int,      # The ID of the campaign
-    location_id: int,      # The ID of the location to update
-    name: str = None,      # The name of the location (optional)
-    entry: str = None,     # The location's entry/description (optional, must be HTML)
-    type: str = None,      # Type of location (optional)
-    parent_location_id: int = None, # Deprecated, do not use
-    new_parent_location_id: int = None, # The parent location id (optional, use this instead of location_id)
-    tags: list = None,     # Array of tag ids (optional)
-    is_destroyed: bool = None, # If the location is destroyed (optional)
-    is_private: bool = None    # If the location is only visible to admin members (optional)
+def resolve_entity(
+    campaign_id: int,          # The ID of the campaign
+    name: str,                 # Name, alias or the start of one, e.g. "Wintercrest" or "winter"
+    entity_type: str = None,   # Restrict to one type, e.g. "races" or "locations" (optional)
+    limit: int = 5             # Maximum number of matches (optional)
 ):
-    """Update an existing location.
+    """Turn an entity name into its type, ID and entity_id without calling the Kanka API.
+    Use it to fill ID arguments such as race_id, family_id, location_id or the entity_id of create_post.
+    Matches exact names and aliases, the start of a name or of its words, and similar names (typos), best first.
+    Only entities this server has already seen are known (through list_*, get_*, the write tools
+    or sync_campaign); if nothing is found, run list_<type> or sync_campaign first.
     Fields:
         campaign_id: The ID of the campaign
-        location_id: The ID of the location to update
-        name: The name of the location (optional)
-        entry: The location's entry/description (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        type: Type of location (optional)
-        new_parent_location_id: The parent location id (optional)
-        tags: Array of tag ids (optional)
-        is_destroyed: If the location is destroyed (optional)
-        is_private: If the location is only visible to admin members (optional)
+        name: Name, alias or the start of one, e.g. "Wintercrest" or "winter"
+        entity_type: Restrict to one type, e.g. "races" or "locations" (optional)
+        limit: Maximum number of matches (optional, default 5)
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/locations/{location_id}"
-    data = {}
-    if name is not None:
-        data["name"] = name
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if type is not None:
-        data["type"] = type
-    if new_parent_location_id is not None:
-        data["location_id"] = new_parent_location_id
-    if tags is not None:
-        data["tags"] = tags
-    if is_destroyed is not None:
-        data["is_destroyed"] = is_destroyed
-    if is_private is not None:
-        data["is_private"] = is_private
-    response = requests.put(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
-
-@mcp.tool()
-def delete_location(campaign_id: int, location_id: int):
-    """Delete a location by ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/locations/{location_id}"
-    response = requests.delete(url, headers=get_headers())
-    if response.status_code == 204:
-        return {"success": True}
-    response.raise_for_status()
-    return {"success": False, "error": response.text}
-
-@mcp.tool()
-def list_posts(campaign_id: int, entity_id: int):
-    """List all posts for a given entity in a campaign. Note: entity_id is the ID of the entity, not the post object ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/entities/{entity_id}/posts"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+    resolver = get_workspace().resolver
+    entity_types = [entity_type] if entity_type else None
+    return {
+        "matches": resolver.resolve(campaign_id, name, entity_types, max(1, limit)),
+        "indexed": resolver.count(campaign_id),
+    }
 
 @mcp.tool()
-def get_post(campaign_id: int, entity_id: int, post_id: int):
-    """Get a single post by ID for a given entity. Note: entity_id is the ID of the entity, not the post object ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/entities/{entity_id}/posts/{post_id}"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+async def get_entity_graph(
+    campaign_id: int,     # The ID of the campaign
+    entity_type: str,     # Type of the root entity, e.g. "characters"
+    object_id: int,       # ID of the root entity (e.g. the character_id)
+    depth: int = 1,       # How many levels of references to follow (optional)
+    compact: bool = False # Return short summaries with a plain-text entry excerpt (optional)
+):
+    """Get an entity together with the entities it references, in one call.
+    References are followed through fields such as family_id, race_id, location_id and parent IDs,
+    lists of IDs (e.g. races) and relations. Each level is fetched concurrently and every entity only once;
+    entities include their posts and relations.
+    Fields:
+        campaign_id: The ID of the campaign
+        entity_type: Type of the root entity, e.g. "characters", "locations", "families"
+        object_id: ID of the root entity (e.g. the character_id)
+        depth: How many levels of references to follow (optional, default 1)
+        compact: Return short summaries (id, entity_id, name, type and a plain-text entry excerpt) (optional)
+    Returns nodes keyed by "<type>:<id>", the edges between them, and references that could not be fetched.
+    """
+    if entity_type not in SCHEMAS or SCHEMAS[entity_type].parent_arg:
+        raise ValueError(f"Unsupported entity type: {entity_type}")
+    from kanka_graph import EntityGraph
+    graph = await EntityGraph(get_client(), campaign_id).build(entity_type, object_id, max(0, depth))
+    if compact:
+        graph["nodes"] = {key: shape_record(node, compact=True) for key, node in graph["nodes"].items()}
+    return graph
+
+def data_path(path: str) -> str:
+    """Resolve the server file an export or import tool was given.
+
+    With KANKA_EXPORT_DIR set, files are confined to that directory; over
+    HTTP it is required, so remote clients cannot read or overwrite other
+    files of the host.
+    """
+    base = os.getenv("KANKA_EXPORT_DIR")
+    if base:
+        from kanka_export import confined_path
+        return confined_path(path, base)
+    if _http_request() is not None:
+        raise ValueError("Exports and imports over HTTP need KANKA_EXPORT_DIR to be set on the server")
+    return path
 
 @mcp.tool()
-def create_post(
-    campaign_id: int,  # The ID of the campaign
-    entity_id: int,    # The ID of the entity this post belongs to (Required)
-    name: str,         # The name/title of the post (required)
-    entry: str = None, # The post content (optional, must be HTML)
-    position: int = None, # The position/order of the post for ordering pinned posts (optional)
-    visibility_id: int = None, # The visibility: 1 for all, 2 self, 3 admin, 4 self-admin or 5 members (optional)
-    is_pinned: bool = None,    # Whether the post is pinned (optional)
-    settings: dict = None,     # Settings object. E.g. collapsed:1 if pinned post should be collapsed on load (optional)
-    tags: list = None           # Array of tag ids (optional)
+async def export_campaign(
+    campaign_id: int,          # The ID of the campaign to export
+    path: str,                 # File to write, e.g. "campaign-42.ndjson.gz"
+    compression: str = None,   # "gzip", "zstd" or "none"; taken from the file extension when omitted (optional)
+    entity_types: list = None, # Export only these types, e.g. ["characters", "locations"] (optional)
+    posts: bool = True,        # Include the posts of every entity (optional)
+    resume: bool = True        # Continue an interrupted export of the same file (optional)
 ):
-    """Create a new post for an entity in a campaign.
+    """Export a whole campaign to an NDJSON file on the server, streaming records to disk as they arrive.
+    Walks every entity type (or the given ones) page by page, with the posts of each entity, at bulk priority
+    within the rate limit. Each line is {"type": ..., "data": {...}}; the first line is the campaign.
+    Progress is checkpointed after every page, so an interrupted export run again with the same arguments
+    continues where it stopped. Returns the number of records written per type.
     Fields:
-        campaign_id: The ID of the campaign
-        entity_id: The ID of the entity this post belongs to (Required)
-        name: The name/title of the post (required)
-        entry: The post content (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        position: The position/order of the post for ordering pinned posts (optional)
-        visibility_id: The visibility: 1 for all, 2 self, 3 admin, 4 self-admin or 5 members (optional)
-        is_pinned: Whether the post is pinned (optional)
-        settings: Settings object. E.g. {'collapsed': 1} if pinned post should be collapsed on load (optional)
-        tags: Array of tag ids (optional)
+        campaign_id: The ID of the campaign to export
+        path: File to write, e.g. "campaign-42.ndjson.gz", relative to the export directory when one is set
+        compression: "gzip", "zstd" or "none"; taken from the file extension (.gz, .zst) when omitted (optional)
+        entity_types: Export only these types, e.g. ["characters", "locations"] (optional, default all)
+        posts: Include the posts of every entity (optional, default true)
+        resume: Continue an interrupted export of the same file (optional, default true)
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/entities/{entity_id}/posts"
-    data = {"name": name, "entity_id": entity_id}
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if position is not None:
-        data["position"] = position
-    if visibility_id is not None:
-        data["visibility_id"] = visibility_id
-    if is_pinned is not None:
-        data["is_pinned"] = is_pinned
-    if settings is not None:
-        data["settings"] = settings
-    if tags is not None:
-        data["tags"] = tags
-    response = requests.post(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
+    from kanka_export import CampaignExporter
+    exporter = CampaignExporter(get_client(), campaign_id, data_path(path), compression, entity_types, posts)
+    return await exporter.run(resume)
 
 @mcp.tool()
-def update_post(
-    campaign_id: int,  # The ID of the campaign
-    entity_id: int,    # The ID of the entity this post belongs to
-    post_id: int,      # The ID of the post to update
-    name: str = None,  # The name/title of the post (optional)
-    entry: str = None, # The post content (optional, must be HTML)
-    position: int = None, # The position/order of the post for ordering pinned posts (optional)
-    visibility_id: int = None, # The visibility: 1 for all, 2 self, 3 admin, 4 self-admin or 5 members (optional)
-    is_pinned: bool = None,    # Whether the post is pinned (optional)
-    settings: dict = None,     # Settings object. E.g. collapsed:1 if pinned post should be collapsed on load (optional)
-    tags: list = None          # Array of tag ids (optional)
+async def import_entities(
+    campaign_id: int,          # The ID of the campaign to import into
+    path: str,                 # NDJSON (.ndjson/.jsonl, optionally .gz/.zst) or CSV file on the server
+    entity_type: str = None,   # Type of rows that don't name one, e.g. "characters" (optional)
+    key: str = None,           # Match rows to entities on this field before trying the name, e.g. "id" (optional)
+    dry_run: bool = False      # Only report the planned operations and their request cost (optional)
 ):
-    """Update a post for an entity in a campaign.
+    """Import entities from an NDJSON or CSV file, creating new ones and updating only what changed.
+    Rows are records with fields named like the create_* tool arguments (CSV columns or JSON keys; a CSV
+    mixing types needs an entity_type column), or the lines of an export_campaign file. Each row is matched
+    to an existing entity of its type by `key` when set and present, otherwise by name: unmatched rows are
+    created, matched rows are updated with the changed fields only, identical rows are skipped. Posts (a
+    "posts" list on a row, or exported post lines) are matched by name among the entity's posts.
+    Writes are sent concurrently at bulk priority within the rate limit. Run with dry_run first to review.
     Fields:
-        campaign_id: The ID of the campaign
-        entity_id: The ID of the entity this post belongs to
-        post_id: The ID of the post to update
-        name: The name/title of the post (optional)
-        entry: The post content (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        position: The position/order of the post for ordering pinned posts (optional)
-        visibility_id: The visibility: 1 for all, 2 self, 3 admin, 4 self-admin or 5 members (optional)
-        is_pinned: Whether the post is pinned (optional)
-        settings: Settings object. E.g. {'collapsed': 1} if pinned post should be collapsed on load (optional)
-        tags: Array of tag ids (optional)
+        campaign_id: The ID of the campaign to import into
+        path: NDJSON (.ndjson/.jsonl, optionally .gz/.zst) or CSV file on the server, relative to the export directory when one is set
+        entity_type: Type of rows that don't name one, e.g. "characters" (optional)
+        key: Match rows to entities on this field before trying the name, e.g. "id" (optional)
+        dry_run: Only report the planned operations and their request cost (optional)
+    Returns counts per operation, the operations (up to 100) and per-row errors.
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/entities/{entity_id}/posts/{post_id}"
-    data = {}
-    if name is not None:
-        data["name"] = name
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if position is not None:
-        data["position"] = position
-    if visibility_id is not None:
-        data["visibility_id"] = visibility_id
-    if is_pinned is not None:
-        data["is_pinned"] = is_pinned
-    if settings is not None:
-        data["settings"] = settings
-    if tags is not None:
-        data["tags"] = tags
-    response = requests.put(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
+    from kanka_import import CampaignImporter
+    importer = CampaignImporter(get_client(), campaign_id, entity_type, key, dry_run)
+    return await importer.run(data_path(path))
 
 @mcp.tool()
-def delete_post(campaign_id: int, entity_id: int, post_id: int):
-    """Delete a post by ID for a given entity. Note: entity_id is the ID of the entity, not the post object ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/entities/{entity_id}/posts/{post_id}"
-    response = requests.delete(url, headers=get_headers())
-    if response.status_code == 204:
-        return {"success": True}
-    response.raise_for_status()
-    return {"success": False, "error": response.text}
+async def flush_writes():
+    """Send the updates held by the write-behind queue now and confirm the writes made so far.
+    With KANKA_WRITE_BEHIND set, update tools return at once with a write_id and successive edits of an
+    entity are sent as one request after a short window. Call this before relying on the edits being saved.
+    Returns one result per sent write since the previous call: its status (written, retrying, failed or
+    discarded), path, the write_ids it carried and the fields it set.
+    """
+    queue = get_workspace().write_queue
+    if queue is None:
+        return {"write_behind": False, "results": []}
+    await queue.flush()
+    return {"write_behind": True, "results": queue.drain(), **queue.stats()}
 
 @mcp.tool()
-def list_notes(campaign_id: int):
-    """List all notes in a campaign."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/notes"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+def client_stats():
+    """Show connection pool and response cache statistics of the Kanka HTTP client (for monitoring).
+    The statistics are those of the API key making the call."""
+    workspace = get_workspace()
+    return {**workspace.client.stats(), "workspace": {"key_id": workspace.key_id, **get_registry().stats()}}
 
 @mcp.tool()
-def get_note(campaign_id: int, note_id: int):
-    """Get a single note by ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/notes/{note_id}"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+def server_stats(format: str = "json"):
+    """Show latency and throughput metrics of the whole server (for monitoring).
+    Covers every tool call and Kanka request since the server started: per-tool and per-endpoint
+    latency (count, mean, p50, p95, p99), errors, upstream status codes, bytes transferred,
+    429 retries, cache hits and rate-limit waits.
+    Fields:
+        format: "json" for a summary, or "prometheus" for the Prometheus text exposition format (optional)
+    """
+    if format == "prometheus":
+        return metrics.prometheus()
+    return {**metrics.snapshot(), "workspaces": get_registry().stats()}
+
+async def prometheus_metrics(request):
+    """Prometheus scrape endpoint of the HTTP transports."""
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+def register_resource_tools(schema):
+    """Register the list_, get_, create_, update_ and delete_ tools generated from an entity schema."""
+    tools = (
+        build_list_tool(schema, get_client, shape_response),
+        build_get_tool(schema, get_client, shape_response),
+        build_create_tool(schema, get_client),
+        build_update_tool(schema, get_writer),
+        build_delete_tool(schema, get_client),
+    )
+    for tool in tools:
+        mcp.tool()(tool)
+        globals()[tool.__name__] = tool
+
+for _schema in SCHEMAS.values():
+    register_resource_tools(_schema)
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"{error.response.status_code}: {error.response.text[:500]}"
+    return f"{type(error).__name__}: {error}"
+
+async def _run_bulk(operation, campaign_id: int, items: list):
+    """Run a single-item tool for every item concurrently and report each outcome.
+
+    Requests are scheduled at bulk priority, so interactive calls made at the
+    same time are not held up behind a large batch.
+    """
+    async def run(item):
+        return await operation(campaign_id, **item)
+
+    from kanka_client import request_priority
+    from kanka_ratelimit import PRIORITY_BULK
+    token = request_priority.set(PRIORITY_BULK)
+    try:
+        results = await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+    finally:
+        request_priority.reset(token)
+    report = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            report.append({"index": index, "success": False, "error": _error_message(result)})
+        else:
+            report.append({"index": index, "success": True, "data": result.get("data", result)})
+    succeeded = sum(1 for item in report if item["success"])
+    return {"succeeded": succeeded, "failed": len(report) - succeeded, "results": report}
 
 @mcp.tool()
-def create_note(
-    campaign_id: int,  # The ID of the campaign to add the note to
-    name: str,         # The name of the note (required)
-    entry: str = None, # The note's entry/description (optional, must be HTML)
-    type: str = None,  # The note's type (optional)
-    note_id: int = None, # The parent note id (optional)
-    tags: list = None,   # Array of tag ids (optional)
-    entity_image_uuid: str = None, # Gallery image UUID for the entity image (optional)
-    entity_header_uuid: str = None, # Gallery image UUID for the entity header (limited to premium campaigns) (optional)
-    is_private: bool = None    # If the note is only visible to admin members (optional)
-):
-    """Create a new note in a campaign.
+async def bulk_create_characters(campaign_id: int, items: list):
+    """Create many characters in a campaign at once.
     Fields:
-        campaign_id: The ID of the campaign to add the note to
-        name: The name of the note (required)
-        entry: The note's entry/description (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        type: The note's type (optional)
-        note_id: The parent note id (optional)
-        tags: Array of tag ids (optional)
-        entity_image_uuid: Gallery image UUID for the entity image (optional)
-        entity_header_uuid: Gallery image UUID for the entity header (limited to premium campaigns) (optional)
-        is_private: If the note is only visible to admin members (optional)
+        campaign_id: The ID of the campaign to add the characters to
+        items: List of objects with the same fields as create_character (name is required),
+            e.g. [{"name": "Aria", "title": "Captain", "entry": "..."}]
+    Returns per-item results in the same order as items; failed items carry an error.
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/notes"
-    data = {"name": name}
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if type is not None:
-        data["type"] = type
-    if note_id is not None:
-        data["note_id"] = note_id
-    if tags is not None:
-        data["tags"] = tags
-    if entity_image_uuid is not None:
-        data["entity_image_uuid"] = entity_image_uuid
-    if entity_header_uuid is not None:
-        data["entity_header_uuid"] = entity_header_uuid
-    if is_private is not None:
-        data["is_private"] = is_private
-    response = requests.post(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
+    return await _run_bulk(create_character, campaign_id, items)
 
 @mcp.tool()
-def update_note(
-    campaign_id: int,     # The ID of the campaign
-    note_id: int,         # The ID of the note to update
-    name: str = None,     # The name of the note (optional)
-    entry: str = None,    # The note's entry/description (optional, must be HTML)
-    type: str = None,     # The note's type (optional)
-    parent_note_id: int = None, # The parent note id (optional)
-    tags: list = None,    # Array of tag ids (optional)
-    entity_image_uuid: str = None, # Gallery image UUID for the entity image (optional)
-    entity_header_uuid: str = None, # Gallery image UUID for the entity header (limited to premium campaigns) (optional)
-    is_private: bool = None     # If the note is only visible to admin members (optional)
-):
-    """Update an existing note.
+async def bulk_update_characters(campaign_id: int, items: list):
+    """Update many characters at once.
     Fields:
         campaign_id: The ID of the campaign
-        note_id: The ID of the note to update
-        name: The name of the note (optional)
-        entry: The note's entry/description (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        type: The note's type (optional)
-        parent_note_id: The parent note id (optional)
-        tags: Array of tag ids (optional)
-        entity_image_uuid: Gallery image UUID for the entity image (optional)
-        entity_header_uuid: Gallery image UUID for the entity header (limited to premium campaigns) (optional)
-        is_private: If the note is only visible to admin members (optional)
+        items: List of objects with the same fields as update_character (character_id is required),
+            e.g. [{"character_id": 12, "is_dead": true}]
+    Returns per-item results in the same order as items; failed items carry an error.
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/notes/{note_id}"
-    data = {}
-    if name is not None:
-        data["name"] = name
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if type is not None:
-        data["type"] = type
-    if parent_note_id is not None:
-        data["note_id"] = parent_note_id
-    if tags is not None:
-        data["tags"] = tags
-    if entity_image_uuid is not None:
-        data["entity_image_uuid"] = entity_image_uuid
-    if entity_header_uuid is not None:
-        data["entity_header_uuid"] = entity_header_uuid
-    if is_private is not None:
-        data["is_private"] = is_private
-    response = requests.put(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
+    return await _run_bulk(update_character, campaign_id, items)
 
 @mcp.tool()
-def delete_note(campaign_id: int, note_id: int):
-    """Delete a note by ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/notes/{note_id}"
-    response = requests.delete(url, headers=get_headers())
-    if response.status_code == 204:
-        return {"success": True}
-    response.raise_for_status()
-    return {"success": False, "error": response.text}
+async def bulk_create_locations(campaign_id: int, items: list):
+    """Create many locations in a campaign at once.
+    Fields:
+        campaign_id: The ID of the campaign to add the locations to
+        items: List of objects with the same fields as create_location (name is required)
+    Returns per-item results in the same order as items; failed items carry an error.
+    """
+    return await _run_bulk(create_location, campaign_id, items)
 
 @mcp.tool()
-def list_journals(campaign_id: int):
-    """List all journals in a campaign."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/journals"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+async def bulk_update_locations(campaign_id: int, items: list):
+    """Update many locations at once.
+    Fields:
+        campaign_id: The ID of the campaign
+        items: List of objects with the same fields as update_location (location_id is required)
+    Returns per-item results in the same order as items; failed items carry an error.
+    """
+    return await _run_bulk(update_location, campaign_id, items)
 
 @mcp.tool()
-def get_journal(campaign_id: int, journal_id: int):
-    """Get a single journal by ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/journals/{journal_id}"
-    response = requests.get(url, headers=get_headers())
-    response.raise_for_status()
-    return response.json()
+async def bulk_create_notes(campaign_id: int, items: list):
+    """Create many notes in a campaign at once.
+    Fields:
+        campaign_id: The ID of the campaign to add the notes to
+        items: List of objects with the same fields as create_note (name is required)
+    Returns per-item results in the same order as items; failed items carry an error.
+    """
+    return await _run_bulk(create_note, campaign_id, items)
 
 @mcp.tool()
-def create_journal(
-    campaign_id: int,  # The ID of the campaign to add the journal to
-    name: str,         # The name of the journal (required)
-    entry: str = None, # The journal's entry/description (optional, must be HTML)
-    type: str = None,  # The journal's type (optional)
-    date: str = None,  # The date of the session (optional)
-    journal_id: int = None, # The ID of the journal's parent journal (optional)
-    author_id: int = None,  # The "author" of the journal (entity id) (optional)
-    tags: list = None,      # Array of tag ids (optional)
-    entity_image_uuid: str = None, # Gallery image UUID for the entity image (optional)
-    entity_header_uuid: str = None, # Gallery image UUID for the entity header (premium campaigns) (optional)
-    is_private: bool = None    # If the journal is only visible to admin members (optional)
-):
-    """Create a new journal in a campaign.
+async def bulk_update_notes(campaign_id: int, items: list):
+    """Update many notes at once.
     Fields:
-        campaign_id: The ID of the campaign to add the journal to
-        name: The name of the journal (required)
-        entry: The journal's entry/description (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        type: The journal's type (optional)
-        date: The date of the session (optional)
-        journal_id: The ID of the journal's parent journal (optional)
-        author_id: The "author" of the journal (entity id) (optional)
-        tags: Array of tag ids (optional)
-        entity_image_uuid: Gallery image UUID for the entity image (optional)
-        entity_header_uuid: Gallery image UUID for the entity header (premium campaigns) (optional)
-        is_private: If the journal is only visible to admin members (optional)
+        campaign_id: The ID of the campaign
+        items: List of objects with the same fields as update_note (note_id is required)
+    Returns per-item results in the same order as items; failed items carry an error.
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/journals"
-    data = {"name": name}
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if type is not None:
-        data["type"] = type
-    if date is not None:
-        data["date"] = date
-    if journal_id is not None:
-        data["journal_id"] = journal_id
-    if author_id is not None:
-        data["author_id"] = author_id
-    if tags is not None:
-        data["tags"] = tags
-    if entity_image_uuid is not None:
-        data["entity_image_uuid"] = entity_image_uuid
-    if entity_header_uuid is not None:
-        data["entity_header_uuid"] = entity_header_uuid
-    if is_private is not None:
-        data["is_private"] = is_private
-    response = requests.post(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
+    return await _run_bulk(update_note, campaign_id, items)
 
 @mcp.tool()
-def update_journal(
-    campaign_id: int,     # The ID of the campaign
-    journal_id: int,      # The ID of the journal to update
-    name: str = None,     # The name of the journal (optional)
-    entry: str = None,    # The journal's entry/description (optional, must be HTML)
-    type: str = None,     # The journal's type (optional)
-    date: str = None,     # The date of the session (optional)
-    parent_journal_id: int = None, # The ID of the journal's parent journal (optional)
-    author_id: int = None,  # The "author" of the journal (entity id) (optional)
-    tags: list = None,      # Array of tag ids (optional)
-    entity_image_uuid: str = None, # Gallery image UUID for the entity image (optional)
-    entity_header_uuid: str = None, # Gallery image UUID for the entity header (premium campaigns) (optional)
-    is_private: bool = None     # If the journal is only visible to admin members (optional)
-):
-    """Update an existing journal.
+async def bulk_create_journals(campaign_id: int, items: list):
+    """Create many journals in a campaign at once.
     Fields:
-        campaign_id: The ID of the campaign
-        journal_id: The ID of the journal to update
-        name: The name of the journal (optional)
-        entry: The journal's entry/description (optional, must be HTML. If not HTML, it will be wrapped in <p> tags.)
-        type: The journal's type (optional)
-        date: The date of the session (optional)
-        parent_journal_id: The ID of the journal's parent journal (optional)
-        author_id: The "author" of the journal (entity id) (optional)
-        tags: Array of tag ids (optional)
-        entity_image_uuid: Gallery image UUID for the entity image (optional)
-        entity_header_uuid: Gallery image UUID for the entity header (premium campaigns) (optional)
-        is_private: If the journal is only visible to admin members (optional)
+        campaign_id: The ID of the campaign to add the journals to
+        items: List of objects with the same fields as create_journal (name is required)
+    Returns per-item results in the same order as items; failed items carry an error.
     """
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/journals/{journal_id}"
-    data = {}
-    if name is not None:
-        data["name"] = name
-    if entry is not None:
-        entry_str = entry.strip()
-        if not (entry_str.startswith('<') and entry_str.endswith('>')):
-            entry_str = f"<p>{entry_str}</p>"
-        data["entry"] = entry_str
-    if type is not None:
-        data["type"] = type
-    if date is not None:
-        data["date"] = date
-    if parent_journal_id is not None:
-        data["journal_id"] = parent_journal_id
-    if author_id is not None:
-        data["author_id"] = author_id
-    if tags is not None:
-        data["tags"] = tags
-    if entity_image_uuid is not None:
-        data["entity_image_uuid"] = entity_image_uuid
-    if entity_header_uuid is not None:
-        data["entity_header_uuid"] = entity_header_uuid
-    if is_private is not None:
-        data["is_private"] = is_private
-    response = requests.put(url, headers=get_headers(), json=data)
-    response.raise_for_status()
-    return response.json()
+    return await _run_bulk(create_journal, campaign_id, items)
 
 @mcp.tool()
-def delete_journal(campaign_id: int, journal_id: int):
-    """Delete a journal by ID."""
-    url = f"https://api.kanka.io/1.0/campaigns/{campaign_id}/journals/{journal_id}"
-    response = requests.delete(url, headers=get_headers())
-    if response.status_code == 204:
-        return {"success": True}
-    response.raise_for_status()
-    return {"success": False, "error": response.text}
+async def bulk_update_journals(campaign_id: int, items: list):
+    """Update many journals at once.
+    Fields:
+        campaign_id: The ID of the campaign
+        items: List of objects with the same fields as update_journal (journal_id is required)
+    Returns per-item results in the same order as items; failed items carry an error.
+    """
+    return await _run_bulk(update_journal, campaign_id, items)
+
+def http_app():
+    """Build the ASGI app of the HTTP transport; used by each uvicorn worker."""
+    if os.getenv("KANKA_HOST", "127.0.0.1") not in ("127.0.0.1", "localhost", "::1"):
+        # FastMCP only accepts localhost Host headers by default.
+        mcp.settings.transport_security = None
+    if os.getenv("KANKA_TRANSPORT") == "sse":
+        app = mcp.sse_app()
+    else:
+        # Sessions live in one process, so several workers must not keep any.
+        mcp.settings.stateless_http = int(os.getenv("KANKA_WORKERS", "1")) > 1
+        app = mcp.streamable_http_app()
+    # Added here rather than at import, so stdio never depends on the HTTP app.
+    app.router.routes.append(Route("/metrics", prometheus_metrics, methods=["GET"]))
+    return _flush_on_shutdown(app)
+
+def _flush_on_shutdown(app):
+    """Send the queued updates once the app's own lifespan has ended."""
+    lifespan = app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def flushing_lifespan(app):
+        try:
+            async with lifespan(app) as state:
+                yield state
+        finally:
+            if _registry is not None:
+                await _registry.close_writes()
+
+    app.router.lifespan_context = flushing_lifespan
+    return app
+
+async def _serve_stdio():
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        if _registry is not None:
+            await _registry.close_writes()
 
 def main_mcp():
-    mcp.run(transport="stdio")
+    parser = argparse.ArgumentParser(description="Kanka MCP server")
+    parser.add_argument("--transport", choices=("stdio", "streamable-http", "sse"),
+                        default=os.getenv("KANKA_TRANSPORT", "stdio"))
+    parser.add_argument("--host", default=os.getenv("KANKA_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("KANKA_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("KANKA_WORKERS", "1")))
+    args = parser.parse_args()
+    if args.transport == "stdio":
+        asyncio.run(_serve_stdio())
+        return
+    if args.transport == "sse" and args.workers > 1:
+        parser.error("the sse transport keeps sessions in memory and cannot use several workers")
+    # Workers re-import this module, so the settings travel in the environment.
+    os.environ["KANKA_TRANSPORT"] = args.transport
+    os.environ["KANKA_HOST"] = args.host
+    os.environ["KANKA_WORKERS"] = str(args.workers)
+    import uvicorn
+    if args.workers > 1:
+        uvicorn.run("kanka_mcp:http_app", factory=True, host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(http_app(), host=args.host, port=args.port)
 
 if __name__ == "__main__":
     main_mcp()
@@ -0,0 +1,216 @@
+import contextlib
+import re
+import time
+from collections import defaultdict
+
+try:
+    from opentelemetry import trace
+except ImportError:  # OpenTelemetry is optional
+    trace = None
+
+# Upper bounds (seconds) of the latency histogram buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+_ID = re.compile(r"\d+")
+
+
+def endpoint(method: str, path: str) -> str:
+    """Label a request by method and path template, e.g. "GET campaigns/{id}/characters"."""
+    return f"{method} {_ID.sub('{id}', path.split('?', 1)[0])}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+class Histogram:
+    """Cumulative latency histogram with Prometheus-style buckets."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating within its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(BUCKETS, self.counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 4) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "p99": round(self.quantile(0.99), 4),
+            "max": round(self.max, 4),
+        }
+
+    def prometheus(self, name: str, **labels) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{{{_labels(**labels, le=le)}}} {cumulative}")
+        label_text = f"{{{_labels(**labels)}}}" if labels else ""
+        lines.append(f"{name}_sum{label_text} {self.sum}")
+        lines.append(f"{name}_count{label_text} {self.count}")
+        return lines
+
+
+class Metrics:
+    """Process-wide latency and throughput measurements of tools and Kanka requests.
+
+    Records per-tool and per-endpoint latency histograms, upstream status
+    codes, bytes transferred, 429 retries, cache events and rate-limit waits.
+    When the optional `opentelemetry` package is installed, tool calls and
+    Kanka requests are also traced as spans.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.tools = defaultdict(Histogram)
+        self.tool_errors = defaultdict(int)
+        self.endpoints = defaultdict(Histogram)
+        self.statuses = defaultdict(int)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.cache_events = defaultdict(int)
+        self.rate_limit_waits = Histogram()
+        self.tracer = trace.get_tracer("kanka-mcp") if trace is not None else None
+
+    @contextlib.contextmanager
+    def _span(self, name: str, **attributes):
+        if self.tracer is None:
+            yield None
+            return
+        with self.tracer.start_as_current_span(name, attributes=attributes) as span:
+            yield span
+
+    @contextlib.contextmanager
+    def tool_call(self, tool: str):
+        """Time an MCP tool call; exceptions count as errors."""
+        started = time.perf_counter()
+        try:
+            with self._span(f"tool {tool}", tool=tool):
+                yield
+        except BaseException:
+            self.tool_errors[tool] += 1
+            raise
+        finally:
+            self.tools[tool].observe(time.perf_counter() - started)
+
+    @contextlib.contextmanager
+    def upstream(self, method: str, path: str):
+        """Time one request to Kanka; the caller reports the response via `record_response`."""
+        label = endpoint(method, path)
+        started = time.perf_counter()
+        with self._span(f"kanka {label}", endpoint=label) as span:
+            try:
+                yield span
+            finally:
+                self.endpoints[label].observe(time.perf_counter() - started)
+
+    def record_response(self, method: str, path: str, response, span=None):
+        self.statuses[(endpoint(method, path), response.status_code)] += 1
+        self.bytes_sent += len(response.request.content or b"")
+        self.bytes_received += len(response.content)
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+
+    def record_retry(self):
+        self.retries += 1
+
+    def record_cache(self, event: str):
+        self.cache_events[event] += 1
+
+    def record_wait(self, seconds: float):
+        self.rate_limit_waits.observe(seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "tools": {
+                tool: {**histogram.summary(), "errors": self.tool_errors[tool]}
+                for tool, histogram in sorted(self.tools.items())
+            },
+            "endpoints": {label: histogram.summary() for label, histogram in sorted(self.endpoints.items())},
+            "status_codes": {
+                f"{label} {status}": count for (label, status), count in sorted(self.statuses.items())
+            },
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "retries": self.retries,
+            "cache": dict(self.cache_events),
+            "rate_limit_waits": self.rate_limit_waits.summary(),
+            "tracing": self.tracer is not None,
+        }
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP kanka_tool_duration_seconds Duration of MCP tool calls.",
+            "# TYPE kanka_tool_duration_seconds histogram",
+        ]
+        for tool, histogram in sorted(self.tools.items()):
+            lines += histogram.prometheus("kanka_tool_duration_seconds", tool=tool)
+        lines += ["# HELP kanka_tool_errors_total MCP tool calls that failed.", "# TYPE kanka_tool_errors_total counter"]
+        lines += [f"kanka_tool_errors_total{{{_labels(tool=tool)}}} {count}" for tool, count in sorted(self.tool_errors.items())]
+        lines += [
+            "# HELP kanka_upstream_duration_seconds Duration of requests to the Kanka API.",
+            "# TYPE kanka_upstream_duration_seconds histogram",
+        ]
+        for label, histogram in sorted(self.endpoints.items()):
+            lines += histogram.prometheus("kanka_upstream_duration_seconds", endpoint=label)
+        lines += ["# HELP kanka_upstream_responses_total Kanka API responses by status code.", "# TYPE kanka_upstream_responses_total counter"]
+        lines += [
+            f"kanka_upstream_responses_total{{{_labels(endpoint=label, status=status)}}} {count}"
+            for (label, status), count in sorted(self.statuses.items())
+        ]
+        lines += [
+            "# HELP kanka_upstream_bytes_total Bytes sent to and received from the Kanka API.",
+            "# TYPE kanka_upstream_bytes_total counter",
+            f'kanka_upstream_bytes_total{{direction="sent"}} {self.bytes_sent}',
+            f'kanka_upstream_bytes_total{{direction="received"}} {self.bytes_received}',
+            "# HELP kanka_upstream_retries_total Requests retried after a 429 response.",
+            "# TYPE kanka_upstream_retries_total counter",
+            f"kanka_upstream_retries_total {self.retries}",
+            "# HELP kanka_cache_events_total Outcomes of cached reads (hit, store_hit, coalesced, revalidated, miss).",
+            "# TYPE kanka_cache_events_total counter",
+        ]
+        lines += [f"kanka_cache_events_total{{{_labels(event=event)}}} {count}" for event, count in sorted(self.cache_events.items())]
+        lines += [
+            "# HELP kanka_rate_limit_wait_seconds Time requests waited for the rate limiter.",
+            "# TYPE kanka_rate_limit_wait_seconds histogram",
+        ]
+        lines += self.rate_limit_waits.prometheus("kanka_rate_limit_wait_seconds")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every client and tool of the process.
+metrics = Metrics()
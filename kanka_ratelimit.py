@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+
+# Request priorities; lower values are sent first.
+PRIORITY_READ = 0
+PRIORITY_WRITE = 1
+PRIORITY_BULK = 2
+
+
+def _retry_after(value: str):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token bucket metering every request sent to Kanka.
+
+    The bucket holds up to one minute's worth of requests and refills at the
+    per-minute limit. Requests wait in a priority queue, so interactive reads
+    go before writes and bulk work when the bucket runs dry. The limit and the
+    remaining budget are corrected from Kanka's `X-RateLimit-Limit` and
+    `X-RateLimit-Remaining` headers, and a 429 blocks the bucket for the
+    `Retry-After` period (or a jittered exponential backoff).
+
+    Every worker process of the HTTP server has its own bucket, so each one
+    takes an equal share of the limit and the workers together stay under it.
+
+    Configuration through environment variables:
+        KANKA_RATE_LIMIT: Requests per minute before Kanka's headers are seen (default 30)
+        KANKA_MAX_RETRIES: Times a request is retried after a 429 (default 3)
+        KANKA_WORKERS: Worker processes sharing the limit (default 1)
+    """
+
+    def __init__(self, per_minute: int = None, max_retries: int = None, workers: int = None):
+        self.workers = max(1, workers or int(os.getenv("KANKA_WORKERS", "1")))
+        self.per_minute = self._share(per_minute or int(os.getenv("KANKA_RATE_LIMIT", "30")))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("KANKA_MAX_RETRIES", "3"))
+        self.tokens = float(self.per_minute)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._queue = []
+        self._seq = itertools.count()
+        self._changed = asyncio.Condition()
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+        self.retries = 0
+
+    def _share(self, limit: int) -> int:
+        """This process's part of an account-wide per-minute limit."""
+        return max(1, limit // self.workers)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.per_minute, self.tokens + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def _delay(self) -> float:
+        """Seconds until a token can be taken."""
+        self._refill()
+        delay = self._blocked_until - time.monotonic()
+        if self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) * 60 / self.per_minute)
+        return delay
+
+    async def acquire(self, priority: int = PRIORITY_READ):
+        entry = (priority, next(self._seq))
+        started = time.monotonic()
+        async with self._changed:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    delay = self._delay()
+                    head = self._queue[0] == entry
+                    if head and delay <= 0:
+                        heapq.heappop(self._queue)
+                        self.tokens -= 1
+                        self._changed.notify_all()
+                        break
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), delay if head else None)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._changed.notify_all()
+                raise
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self.waits += 1
+            self.wait_seconds += waited
+
+    def update(self, headers):
+        """Align the bucket with Kanka's view of the rate limit."""
+        limit = headers.get("x-ratelimit-limit")
+        if limit and limit.isdigit() and int(limit) > 0:
+            self.per_minute = self._share(int(limit))
+        remaining = headers.get("x-ratelimit-remaining")
+        if remaining and remaining.isdigit():
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+
+    def backoff(self, headers, attempt: int) -> float:
+        """Block the bucket after a 429 and return the delay applied."""
+        delay = _retry_after(headers.get("retry-after"))
+        if delay is None:
+            delay = min(60.0, 2.0 ** attempt)
+        delay += random.uniform(0, 0.25 * delay + 0.1)
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        self.tokens = 0.0
+        self.throttled += 1
+        return delay
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "per_minute": self.per_minute,
+            "workers": self.workers,
+            "tokens": round(self.tokens, 2),
+            "queued": len(self._queue),
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "throttled": self.throttled,
+            "retries": self.retries,
+        }
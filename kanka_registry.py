@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from kanka_client import KankaClient
+from kanka_resolver import EntityResolver
+from kanka_search import SearchIndex
+from kanka_store import open_store
+from kanka_sync import SyncEngine
+from kanka_writes import WriteBehindQueue, write_behind_window
+
+
+def key_id(api_key: str) -> str:
+    """Short, non-reversible identifier of an API key for stats and file names."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def store_path(base: str, api_key: str):
+    """Path of the on-disk store of `api_key` derived from KANKA_STORE_PATH.
+
+    The KANKA_API_KEY key uses the configured file itself; every other key
+    gets its own file next to it, e.g. kanka-3f2a9c0d1e4b5a6f.db.
+    """
+    if not base or api_key == os.getenv("KANKA_API_KEY"):
+        return base
+    root, ext = os.path.splitext(base)
+    return f"{root}-{key_id(api_key)}{ext}"
+
+
+class Workspace:
+    """The client, store and local indexes serving one Kanka API key.
+
+    Nothing is shared between workspaces: each has its own connection pool,
+    response cache, rate-limit bucket, search index, name resolver, store
+    file and, when KANKA_WRITE_BEHIND is set, write-behind queue.
+    """
+
+    def __init__(self, api_key: str):
+        self.key_id = key_id(api_key)
+        self.client = KankaClient(api_key)
+        path = store_path(os.getenv("KANKA_STORE_PATH"), api_key)
+        self.search_index = SearchIndex(path or ":memory:")
+        self.client.observers.append(self.search_index)
+        self.resolver = EntityResolver()
+        self.client.observers.append(self.resolver)
+        store = open_store(path)
+        if store is not None:
+            self.client.attach_store(store)
+            store.warm(self.client.cache)
+        window = write_behind_window()
+        self.write_queue = WriteBehindQueue(self.client, window) if window else None
+        self.client.write_queue = self.write_queue
+        self._sync_engine = None
+        self.last_used = time.monotonic()
+        # Tool calls currently using the workspace; it is not closed while any are.
+        self.users = 0
+
+    def acquire(self):
+        self.users += 1
+
+    def release(self):
+        self.users -= 1
+        self.last_used = time.monotonic()
+
+    @property
+    def sync_engine(self):
+        if self._sync_engine is None:
+            self._sync_engine = SyncEngine(self.client)
+        return self._sync_engine
+
+    async def aclose(self):
+        if self.write_queue is not None:
+            await self.write_queue.close()
+        # Let requests that are still running finish first.
+        while self.client.in_flight:
+            await asyncio.sleep(0.5)
+        await self.client.aclose()
+        self.search_index.close()
+
+
+class WorkspaceRegistry:
+    """Workspaces by API key, bounded in number and closed when idle.
+
+    Keys are only held as SHA-256 digests. When more than `max_workspaces`
+    keys are active, the least recently used workspace is closed; workspaces
+    unused for `idle_timeout` seconds are closed too. Workspaces still used by
+    a tool call (see `Workspace.acquire`) are only closed once it returns.
+
+    Configuration through environment variables:
+        KANKA_MAX_KEYS: Maximum number of API keys served at once (default 100)
+        KANKA_KEY_IDLE_TIMEOUT: Seconds before an unused key's workspace is closed (default 1800)
+    """
+
+    def __init__(self, max_workspaces: int = None, idle_timeout: float = None):
+        self.max_workspaces = max_workspaces or int(os.getenv("KANKA_MAX_KEYS", "100"))
+        self.idle_timeout = idle_timeout or float(os.getenv("KANKA_KEY_IDLE_TIMEOUT", "1800"))
+        self._workspaces = OrderedDict()
+        # Closing evicted workspaces, kept until done so shutdown can wait for them.
+        self._closing = set()
+        self.opened = 0
+        self.closed = 0
+
+    def get(self, api_key: str) -> Workspace:
+        digest = hashlib.sha256(api_key.encode()).digest()
+        workspace = self._workspaces.get(digest)
+        if workspace is None:
+            workspace = self._workspaces[digest] = Workspace(api_key)
+            self.opened += 1
+        self._workspaces.move_to_end(digest)
+        workspace.last_used = time.monotonic()
+        self._evict(keep=digest)
+        return workspace
+
+    def _evict(self, keep=None):
+        cutoff = time.monotonic() - self.idle_timeout
+        for digest, workspace in list(self._workspaces.items()):
+            if len(self._workspaces) <= self.max_workspaces and workspace.last_used >= cutoff:
+                break
+            if workspace.users or digest == keep:
+                continue
+            del self._workspaces[digest]
+            self._close(workspace)
+
+    def _close(self, workspace: Workspace):
+        self.closed += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(workspace.aclose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def close_writes(self):
+        """Send the queued updates of every workspace, and finish closing evicted ones, before shutting down."""
+        await asyncio.gather(*(
+            workspace.write_queue.close() for workspace in self._workspaces.values() if workspace.write_queue is not None
+        ))
+        if self._closing:
+            await asyncio.gather(*list(self._closing), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._workspaces),
+            "in_use": sum(1 for workspace in self._workspaces.values() if workspace.users),
+            "max": self.max_workspaces,
+            "idle_timeout": self.idle_timeout,
+            "opened": self.opened,
+            "closed": self.closed,
+        }
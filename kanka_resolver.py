@@ -0,0 +1,207 @@
+import bisect
+import difflib
+import re
+import unicodedata
+from typing import NamedTuple
+from kanka_cache import parse_path
+from kanka_schema import ENTITY_TYPES, SCHEMAS
+
+# Entity types by the singular name /entities reports.
+_BY_SINGULAR = {SCHEMAS[resource].singular: resource for resource in ENTITY_TYPES}
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Scores of the kinds of matches; fuzzy matches score their similarity times FUZZY.
+EXACT = 1.0
+PREFIX = 0.9
+WORDS = 0.8
+FUZZY = 0.7
+FUZZY_CUTOFF = 0.6
+
+
+def normalize(name: str) -> str:
+    """Case-fold `name`, strip diacritics and punctuation, and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(_WORD.findall(text.casefold()))
+
+
+def _aliases(record: dict) -> tuple:
+    aliases = record.get("aliases") or ()
+    names = (alias.get("name") if isinstance(alias, dict) else alias for alias in aliases)
+    return tuple(name for name in names if isinstance(name, str) and name)
+
+
+class Entry(NamedTuple):
+    entity_type: str
+    id: int
+    entity_id: int
+    name: str
+    aliases: tuple
+
+
+class CampaignNames:
+    """Name and alias lookup tables of one campaign."""
+
+    def __init__(self):
+        self.entries = {}
+        self._names = {}
+        self._words = {}
+        self._sorted_names = None
+        self._sorted_words = None
+
+    def _keys(self, entry: Entry):
+        for name in (entry.name, *entry.aliases):
+            normalized = normalize(name)
+            if normalized:
+                yield normalized
+
+    def add(self, entry: Entry):
+        key = (entry.entity_type, entry.id)
+        old = self.entries.get(key)
+        if old is not None:
+            if old == entry:
+                return
+            self.remove(key)
+        self.entries[key] = entry
+        for normalized in self._keys(entry):
+            self._names.setdefault(normalized, set()).add(key)
+            for word in normalized.split():
+                self._words.setdefault(word, set()).add(key)
+        self._sorted_names = self._sorted_words = None
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for normalized in self._keys(entry):
+            self._discard(self._names, normalized, key)
+            for word in normalized.split():
+                self._discard(self._words, word, key)
+        self._sorted_names = self._sorted_words = None
+
+    @staticmethod
+    def _discard(table: dict, name: str, key):
+        keys = table.get(name)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del table[name]
+
+    @staticmethod
+    def _with_prefix(ordered: list, table: dict, prefix: str) -> set:
+        keys = set()
+        index = bisect.bisect_left(ordered, prefix)
+        while index < len(ordered) and ordered[index].startswith(prefix):
+            keys |= table[ordered[index]]
+            index += 1
+        return keys
+
+    def lookup(self, query: str) -> dict:
+        """Return {key: (score, match)} of the entries matching `query`."""
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self._names)
+            self._sorted_words = sorted(self._words)
+        found = {}
+
+        def add(keys, score, match):
+            for key in keys:
+                if found.get(key, (0.0,))[0] < score:
+                    found[key] = (score, match)
+
+        add(self._names.get(query, ()), EXACT, "exact")
+        add(self._with_prefix(self._sorted_names, self._names, query), PREFIX, "prefix")
+        words = query.split()
+        candidates = None
+        for word in words:
+            keys = self._with_prefix(self._sorted_words, self._words, word)
+            candidates = keys if candidates is None else candidates & keys
+        add(candidates or (), WORDS, "words")
+        if not found:
+            for name in difflib.get_close_matches(query, self._names, n=10, cutoff=FUZZY_CUTOFF):
+                similarity = difflib.SequenceMatcher(None, query, name).ratio()
+                add(self._names[name], round(FUZZY * similarity, 3), "fuzzy")
+        return found
+
+
+class EntityResolver:
+    """In-memory index from entity names and aliases to (type, id, entity_id), per campaign.
+
+    Registered as a client observer, it learns every entity the client lists,
+    reads or writes (including syncs) and forgets deleted ones, so names can
+    be resolved to IDs without calling Kanka. Lookups match exact names,
+    name prefixes, word prefixes in any order and, failing those, similar
+    names (typos).
+    """
+
+    def __init__(self):
+        self.campaigns = {}
+
+    def observe(self, method: str, path: str, params: dict, result):
+        campaign_id, resource, object_id = parse_path(path)
+        if campaign_id is None:
+            return
+        if resource == "entities":
+            if method == "GET":
+                self._observe_entity((result or {}).get("data"), campaign_id)
+            return
+        if resource not in ENTITY_TYPES:
+            return
+        if method == "DELETE":
+            if object_id is not None:
+                self.remove(campaign_id, resource, object_id)
+            return
+        data = (result or {}).get("data")
+        if isinstance(data, dict):
+            data = [data]
+        if data:
+            self.add(campaign_id, resource, data)
+
+    def _observe_entity(self, entity, campaign_id: int):
+        # /entities/{id} answers with the entity itself; child_id is the ID of the typed record.
+        if not isinstance(entity, dict) or not entity.get("child_id"):
+            return
+        resource = _BY_SINGULAR.get(entity.get("type"))
+        if resource is not None:
+            self.add(campaign_id, resource, [{**entity, "id": entity["child_id"], "entity_id": entity.get("id")}])
+
+    def add(self, campaign_id: int, entity_type: str, records: list):
+        names = self.campaigns.setdefault(campaign_id, CampaignNames())
+        for record in records:
+            if "id" in record and record.get("name"):
+                names.add(Entry(entity_type, record["id"], record.get("entity_id"), record["name"], _aliases(record)))
+
+    def remove(self, campaign_id: int, entity_type: str, object_id: int):
+        names = self.campaigns.get(campaign_id)
+        if names is not None:
+            names.remove((entity_type, object_id))
+
+    def count(self, campaign_id: int) -> int:
+        names = self.campaigns.get(campaign_id)
+        return len(names.entries) if names is not None else 0
+
+    def resolve(self, campaign_id: int, query: str, entity_types=None, limit: int = 5) -> list:
+        """Return the entities best matching `query`, best first."""
+        names = self.campaigns.get(campaign_id)
+        normalized = normalize(query)
+        if names is None or not normalized:
+            return []
+        found = names.lookup(normalized)
+        entries = [
+            (score, match, names.entries[key])
+            for key, (score, match) in found.items()
+            if not entity_types or key[0] in entity_types
+        ]
+        entries.sort(key=lambda item: (-item[0], len(item[2].name), item[2].name))
+        return [
+            {
+                "entity_type": entry.entity_type,
+                "id": entry.id,
+                "entity_id": entry.entity_id,
+                "name": entry.name,
+                **({"aliases": list(entry.aliases)} if entry.aliases else {}),
+                "match": match,
+                "score": score,
+            }
+            for score, match, entry in entries[:limit]
+        ]
@@ -0,0 +1,464 @@
+import inspect
+from typing import NamedTuple
+
+_TYPE_NAMES = {str: "a string", int: "an integer", bool: "a boolean", list: "a list", dict: "an object"}
+
+# (argument, type, default, description) of the paging and shaping options.
+GET_PARAMETERS = (
+    ("fields", list, None, 'Only return these fields, e.g. ["id", "name", "type"] (optional)'),
+    ("compact", bool, False, "Return short summaries (id, entity_id, name, type and a plain-text entry excerpt) (optional)"),
+)
+LIST_PARAMETERS = (
+    ("page", int, None, "Return only this page of results (optional)"),
+    ("limit", int, None, "Number of results per page (optional)"),
+    ("max_items", int, None, "Maximum number of results to return (optional, defaults to 500)"),
+    ("cursor", str, None, "Continue from the next_cursor of a previous call (optional)"),
+) + GET_PARAMETERS
+
+
+def wrap_html(entry: str) -> str:
+    """Kanka expects HTML entries; wrap plain text in <p> tags."""
+    entry_str = entry.strip()
+    if not (entry_str.startswith('<') and entry_str.endswith('>')):
+        entry_str = f"<p>{entry_str}</p>"
+    return entry_str
+
+
+class Field(NamedTuple):
+    """One writable field of a Kanka entity.
+
+    `api_name` is the key sent to Kanka (defaults to `name`; None means the
+    argument is accepted but never sent). `update_arg` renames the tool
+    argument in update tools, where `name` may clash with the ID argument.
+    """
+    name: str
+    type: type
+    description: str
+    required: bool = False
+    html: bool = False
+    api_name: str = ""
+    update_arg: str = None
+    on_create: bool = True
+
+    @property
+    def key(self):
+        return self.name if self.api_name == "" else self.api_name
+
+
+class EntitySchema:
+    """Declarative description of a Kanka entity type.
+
+    Payload plans, signatures and docstrings for the create and update tools
+    are derived once, when the schema is built.
+    """
+
+    def __init__(self, resource: str, singular: str, fields: list, parent_arg: str = None):
+        self.resource = resource
+        self.singular = singular
+        self.id_arg = f"{singular}_id"
+        self.parent_arg = parent_arg
+        self.fields = tuple(fields)
+        self.create_fields = tuple(
+            (field.name, field) for field in self.fields if field.on_create
+        )
+        self.update_fields = tuple(
+            (self._update_arg(field), field) for field in self.fields
+        )
+        self.create_plan = self._plan(self.create_fields)
+        self.update_plan = self._plan(self.update_fields)
+        self.create_signature = self._signature(self.create_fields, update=False)
+        self.update_signature = self._signature(self.update_fields, update=True)
+        self.list_signature = self._key_signature(LIST_PARAMETERS, with_id=False)
+        self.get_signature = self._key_signature(GET_PARAMETERS, with_id=True)
+        self.delete_signature = self._key_signature((), with_id=True)
+
+    def _update_arg(self, field: Field) -> str:
+        if field.update_arg:
+            return field.update_arg
+        return f"parent_{field.name}" if field.name == self.id_arg else field.name
+
+    @staticmethod
+    def _plan(fields):
+        return tuple(
+            (arg, field.key, wrap_html if field.html else None)
+            for arg, field in fields if field.key is not None
+        )
+
+    def _key_parameters(self, with_id: bool) -> list:
+        """The campaign, parent entity and object ID arguments every tool starts with."""
+        keyword = inspect.Parameter.POSITIONAL_OR_KEYWORD
+        parameters = [inspect.Parameter("campaign_id", keyword, annotation=int)]
+        if self.parent_arg:
+            parameters.append(inspect.Parameter(self.parent_arg, keyword, annotation=int))
+        if with_id:
+            parameters.append(inspect.Parameter(self.id_arg, keyword, annotation=int))
+        return parameters
+
+    def _signature(self, fields, update: bool) -> inspect.Signature:
+        keyword = inspect.Parameter.POSITIONAL_OR_KEYWORD
+        parameters = self._key_parameters(with_id=update)
+        for arg, field in fields:
+            if field.required and not update:
+                parameters.append(inspect.Parameter(arg, keyword, annotation=field.type))
+            else:
+                parameters.append(inspect.Parameter(arg, keyword, annotation=field.type, default=None))
+        return inspect.Signature(parameters)
+
+    def _key_signature(self, options, with_id: bool) -> inspect.Signature:
+        keyword = inspect.Parameter.POSITIONAL_OR_KEYWORD
+        parameters = self._key_parameters(with_id)
+        for arg, kind, default, _ in options:
+            parameters.append(inspect.Parameter(arg, keyword, annotation=kind, default=default))
+        return inspect.Signature(parameters)
+
+    def path(self, campaign_id: int, parent_id: int = None, object_id: int = None) -> str:
+        path = f"campaigns/{campaign_id}/"
+        if self.parent_arg:
+            path += f"entities/{parent_id}/"
+        path += self.resource
+        if object_id is not None:
+            path += f"/{object_id}"
+        return path
+
+    def validate(self, values: dict, update: bool):
+        """Raise ValueError for missing required fields or wrongly typed values."""
+        fields = self.update_fields if update else self.create_fields
+        for arg, field in fields:
+            value = values.get(arg)
+            if value is None:
+                if field.required and not update:
+                    raise ValueError(f"{arg} is required to create a {self.singular}")
+                continue
+            valid = isinstance(value, field.type)
+            if field.type is int and isinstance(value, bool):
+                valid = False
+            if not valid:
+                raise ValueError(f"{arg} must be {_TYPE_NAMES.get(field.type, field.type.__name__)}")
+
+    @staticmethod
+    def build_payload(plan, values: dict) -> dict:
+        data = {}
+        for arg, key, convert in plan:
+            value = values.get(arg)
+            if value is not None:
+                data[key] = convert(value) if convert is not None else value
+        return data
+
+    def create_payload(self, values: dict) -> dict:
+        data = self.build_payload(self.create_plan, values)
+        if self.parent_arg:
+            data[self.parent_arg] = values[self.parent_arg]
+        return data
+
+    def update_payload(self, values: dict) -> dict:
+        return self.build_payload(self.update_plan, values)
+
+    def _field_docs(self, fields, update: bool) -> list:
+        lines = []
+        for arg, field in fields:
+            if field.key is None:
+                continue
+            need = "required" if field.required and not update else "optional"
+            if field.html:
+                need += ", must be HTML. If not HTML, it will be wrapped in <p> tags."
+            lines.append(f"    {arg}: {field.description} ({need})")
+        return lines
+
+    def _parent_doc(self) -> list:
+        if not self.parent_arg:
+            return []
+        return [f"    {self.parent_arg}: The ID of the entity this {self.singular} belongs to, not the {self.singular} object ID"]
+
+    def _where(self) -> str:
+        return "for a given entity in a campaign" if self.parent_arg else "in a campaign"
+
+    def list_doc(self) -> str:
+        lines = [
+            f"List all {self.resource} {self._where()}.",
+            "Results are paginated: when more results remain, the response contains a next_cursor",
+            "that can be passed back to fetch the next batch.",
+            "Fields:",
+            "    campaign_id: The ID of the campaign",
+        ]
+        lines += self._parent_doc()
+        lines += [f"    {arg}: {description}" for arg, _, _, description in LIST_PARAMETERS]
+        return "\n".join(lines)
+
+    def get_doc(self) -> str:
+        lines = [
+            f"Get a single {self.singular} by ID.",
+            "Use fields to return only some fields (e.g. [\"id\", \"name\", \"entry\"]), or compact for a short summary",
+            "with a plain-text entry excerpt.",
+            "Fields:",
+            "    campaign_id: The ID of the campaign",
+        ]
+        lines += self._parent_doc()
+        lines.append(f"    {self.id_arg}: The ID of the {self.singular}")
+        lines += [f"    {arg}: {description}" for arg, _, _, description in GET_PARAMETERS]
+        return "\n".join(lines)
+
+    def delete_doc(self) -> str:
+        lines = [f"Delete a {self.singular} by ID.", "Fields:", "    campaign_id: The ID of the campaign"]
+        lines += self._parent_doc()
+        lines.append(f"    {self.id_arg}: The ID of the {self.singular} to delete")
+        return "\n".join(lines)
+
+    def create_doc(self) -> str:
+        lines = [
+            f"Create a new {self.singular} {self._where()}.",
+            "Fields:",
+            f"    campaign_id: The ID of the campaign to add the {self.singular} to",
+        ]
+        lines += self._parent_doc()
+        lines += self._field_docs(self.create_fields, update=False)
+        return "\n".join(lines)
+
+    def update_doc(self) -> str:
+        lines = [
+            f"Update an existing {self.singular}.",
+            "Fields:",
+            "    campaign_id: The ID of the campaign",
+        ]
+        lines += self._parent_doc()
+        lines.append(f"    {self.id_arg}: The ID of the {self.singular} to update")
+        lines += self._field_docs(self.update_fields, update=True)
+        return "\n".join(lines)
+
+
+def _generated_tool(name: str, signature: inspect.Signature, doc: str, run):
+    """Wrap `run(values)` in a coroutine function with a real signature."""
+    async def tool(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return await run(bound.arguments)
+
+    tool.__name__ = tool.__qualname__ = name
+    tool.__doc__ = doc
+    tool.__signature__ = signature
+    tool.__annotations__ = {
+        parameter.name: parameter.annotation for parameter in signature.parameters.values()
+    }
+    return tool
+
+
+def build_list_tool(schema: EntitySchema, get_client, shape):
+    async def run(values):
+        path = schema.path(values["campaign_id"], values.get(schema.parent_arg))
+        result = await get_client().paginate(
+            path, page=values["page"], limit=values["limit"], max_items=values["max_items"], cursor=values["cursor"]
+        )
+        return shape(result, values["fields"], values["compact"])
+
+    return _generated_tool(f"list_{schema.resource}", schema.list_signature, schema.list_doc(), run)
+
+
+def build_get_tool(schema: EntitySchema, get_client, shape):
+    async def run(values):
+        path = schema.path(values["campaign_id"], values.get(schema.parent_arg), values[schema.id_arg])
+        return shape(await get_client().get(path), values["fields"], values["compact"])
+
+    return _generated_tool(f"get_{schema.singular}", schema.get_signature, schema.get_doc(), run)
+
+
+def build_delete_tool(schema: EntitySchema, get_client):
+    async def run(values):
+        path = schema.path(values["campaign_id"], values.get(schema.parent_arg), values[schema.id_arg])
+        return await get_client().delete(path)
+
+    return _generated_tool(f"delete_{schema.singular}", schema.delete_signature, schema.delete_doc(), run)
+
+
+def build_create_tool(schema: EntitySchema, get_client):
+    async def run(values):
+        schema.validate(values, update=False)
+        path = schema.path(values["campaign_id"], values.get(schema.parent_arg))
+        return await get_client().post(path, schema.create_payload(values))
+
+    return _generated_tool(f"create_{schema.singular}", schema.create_signature, schema.create_doc(), run)
+
+
+def build_update_tool(schema: EntitySchema, get_client):
+    async def run(values):
+        schema.validate(values, update=True)
+        path = schema.path(values["campaign_id"], values.get(schema.parent_arg), values[schema.id_arg])
+        return await get_client().patch(path, schema.update_payload(values))
+
+    return _generated_tool(f"update_{schema.singular}", schema.update_signature, schema.update_doc(), run)
+
+
+def _name(singular):
+    return Field("name", str, f"The name of the {singular}", required=True)
+
+
+def _entry(singular):
+    return Field("entry", str, f"The {singular}'s entry/description", html=True)
+
+
+def _type(singular):
+    return Field("type", str, f"The {singular}'s type")
+
+
+def _private(singular):
+    return Field("is_private", bool, f"If the {singular} is only visible to admin members")
+
+
+def _parent(singular):
+    return Field(f"{singular}_id", int, f"The ID of the parent {singular}")
+
+
+TAGS = Field("tags", list, "Array of tag ids")
+IMAGE_UUID = Field("entity_image_uuid", str, "Gallery image UUID for the entity image")
+HEADER_UUID = Field("entity_header_uuid", str, "Gallery image UUID for the entity header (limited to premium campaigns)")
+LOCATION_ID = Field("location_id", int, "The ID of the location")
+
+CHARACTER = EntitySchema("characters", "character", [
+    _name("character"),
+    Field("title", str, "The character's title"),
+    Field("type", str, "The type or class of the character"),
+    Field("age", str, "The age of the character"),
+    Field("sex", str, "The sex/gender of the character"),
+    Field("pronouns", str, "The pronouns of the character"),
+    Field("race_id", int, "The ID of the race entity"),
+    Field("family_id", int, "The ID of the family entity"),
+    Field("is_dead", bool, "Whether the character is dead"),
+    Field("image", str, "URL or path to the character's image"),
+    Field("tags", str, "Comma-separated list of tags"),
+    _entry("character"),
+    _private("character"),
+])
+
+LOCATION = EntitySchema("locations", "location", [
+    _name("location"),
+    _entry("location"),
+    Field("type", str, "Type of location"),
+    Field("parent_location_id", int, "Deprecated, do not use", api_name=None, on_create=False),
+    Field("location_id", int, "The parent location id", update_arg="new_parent_location_id"),
+    TAGS,
+    Field("is_destroyed", bool, "If the location is destroyed"),
+    _private("location"),
+])
+
+POST = EntitySchema("posts", "post", [
+    Field("name", str, "The name/title of the post", required=True),
+    Field("entry", str, "The post content", html=True),
+    Field("position", int, "The position/order of the post for ordering pinned posts"),
+    Field("visibility_id", int, "The visibility: 1 for all, 2 self, 3 admin, 4 self-admin or 5 members"),
+    Field("is_pinned", bool, "Whether the post is pinned"),
+    Field("settings", dict, "Settings object. E.g. {'collapsed': 1} if pinned post should be collapsed on load"),
+    TAGS,
+], parent_arg="entity_id")
+
+NOTE = EntitySchema("notes", "note", [
+    _name("note"),
+    _entry("note"),
+    _type("note"),
+    Field("note_id", int, "The parent note id"),
+    TAGS,
+    IMAGE_UUID,
+    HEADER_UUID,
+    _private("note"),
+])
+
+JOURNAL = EntitySchema("journals", "journal", [
+    _name("journal"),
+    _entry("journal"),
+    _type("journal"),
+    Field("date", str, "The date of the session"),
+    Field("journal_id", int, "The ID of the journal's parent journal"),
+    Field("author_id", int, 'The "author" of the journal (entity id)'),
+    TAGS,
+    IMAGE_UUID,
+    HEADER_UUID,
+    _private("journal"),
+])
+
+def _entity(resource, singular, fields=()):
+    """Schema of an entity with the fields most Kanka types share around `fields`."""
+    return EntitySchema(resource, singular, [
+        _name(singular),
+        _entry(singular),
+        _type(singular),
+        _parent(singular),
+        *fields,
+        TAGS,
+        IMAGE_UUID,
+        HEADER_UUID,
+        _private(singular),
+    ])
+
+
+ORGANISATION = _entity("organisations", "organisation", [
+    LOCATION_ID,
+    Field("is_defunct", bool, "If the organisation is defunct"),
+])
+
+FAMILY = _entity("families", "family", [
+    LOCATION_ID,
+    Field("is_extinct", bool, "If the family is extinct"),
+])
+
+ITEM = _entity("items", "item", [
+    Field("price", str, "The item's price"),
+    Field("size", str, "The item's size"),
+    Field("character_id", int, "The ID of the character owning the item"),
+    Field("location_id", int, "The ID of the location the item is in"),
+])
+
+QUEST = _entity("quests", "quest", [
+    Field("character_id", int, "The ID of the character who gave the quest"),
+    Field("date", str, "The date of the quest"),
+    Field("is_completed", bool, "If the quest is completed"),
+])
+
+EVENT = _entity("events", "event", [
+    Field("date", str, "The date of the event"),
+    LOCATION_ID,
+])
+
+RACE = _entity("races", "race", [
+    Field("is_extinct", bool, "If the race is extinct"),
+])
+
+CREATURE = _entity("creatures", "creature", [
+    Field("is_extinct", bool, "If the creature is extinct"),
+    Field("is_dead", bool, "If the creature is dead"),
+])
+
+ABILITY = _entity("abilities", "ability", [
+    Field("charges", str, "The number of charges of the ability"),
+])
+
+TIMELINE = _entity("timelines", "timeline", [
+    Field("revert_order", bool, "If the eras are listed from newest to oldest"),
+])
+
+MAP = _entity("maps", "map", [
+    LOCATION_ID,
+    Field("grid", int, "The size of the map's grid"),
+])
+
+CALENDAR = _entity("calendars", "calendar", [
+    Field("current_year", int, "The calendar's current year"),
+    Field("current_month", int, "The calendar's current month"),
+    Field("current_day", int, "The calendar's current day"),
+    Field("month_name", list, "The names of the months"),
+    Field("month_length", list, "The number of days of each month"),
+    Field("weekday", list, "The names of the weekdays"),
+    Field("suffix", str, "The suffix of years (e.g. AD)"),
+])
+
+TAG = _entity("tags", "tag", [
+    Field("colour", str, "The tag's colour (e.g. red, blue, green)"),
+])
+
+# Every entity type the server exposes tools for, keyed by its API resource.
+SCHEMAS = {
+    schema.resource: schema
+    for schema in (
+        CHARACTER, LOCATION, POST, NOTE, JOURNAL, ORGANISATION, FAMILY, ITEM, QUEST, EVENT,
+        RACE, CREATURE, ABILITY, TIMELINE, MAP, CALENDAR, TAG,
+    )
+}
+
+# Resources of the campaign-level entity types (everything but posts, which belong to an entity).
+ENTITY_TYPES = tuple(resource for resource, schema in SCHEMAS.items() if not schema.parent_arg)
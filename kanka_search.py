@@ -0,0 +1,144 @@
+import html
+import os
+import re
+import sqlite3
+from kanka_cache import parse_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_docs (
+    rowid INTEGER PRIMARY KEY,
+    campaign_id INTEGER NOT NULL,
+    entity_type TEXT NOT NULL,
+    object_id INTEGER NOT NULL,
+    entity_id INTEGER,
+    UNIQUE (campaign_id, entity_type, object_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    name, type, tags, entry, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_TAG = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Column weights for bm25(): name, type, tags, entry.
+_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+
+def strip_html(value: str) -> str:
+    """Return the plain text of an HTML entry."""
+    if not value:
+        return ""
+    return _SPACE.sub(" ", html.unescape(_TAG.sub(" ", value))).strip()
+
+
+def _match_expression(query: str) -> str:
+    """Turn free text into an FTS5 query matching any word by prefix."""
+    words = _WORD.findall(query.lower())
+    return " OR ".join(f'"{word}"*' for word in words)
+
+
+class SearchIndex:
+    """Full-text index over the names, types, tags and entries of entities.
+
+    Registered as a client observer, it indexes every entity and post the
+    client reads or writes (including syncs) and drops deleted ones. The
+    index lives next to the on-disk store when KANKA_STORE_PATH is set and in
+    memory otherwise.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("KANKA_STORE_PATH") or ":memory:"
+        self.db = sqlite3.connect(self.path)
+        if self.path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def observe(self, method: str, path: str, params: dict, result):
+        campaign_id, resource, object_id = parse_path(path)
+        if campaign_id is None or resource == "entities":
+            return
+        entity_type = resource.rsplit("/", 1)[-1]
+        if method == "DELETE":
+            if object_id is not None:
+                self.remove(campaign_id, entity_type, object_id)
+            return
+        data = (result or {}).get("data")
+        if isinstance(data, dict):
+            data = [data]
+        if data:
+            self.index(campaign_id, entity_type, [record for record in data if "id" in record and "name" in record])
+
+    def index(self, campaign_id: int, entity_type: str, records: list):
+        with self.db:
+            for record in records:
+                rowid = self._rowid(campaign_id, entity_type, record["id"])
+                if rowid is None:
+                    rowid = self.db.execute(
+                        "INSERT INTO search_docs (campaign_id, entity_type, object_id, entity_id) VALUES (?, ?, ?, ?)",
+                        (campaign_id, entity_type, record["id"], record.get("entity_id")),
+                    ).lastrowid
+                else:
+                    self.db.execute("DELETE FROM search_index WHERE rowid = ?", (rowid,))
+                name = " ".join(filter(None, (record.get("name"), record.get("title"))))
+                kind = " ".join(filter(None, (entity_type, record.get("type"))))
+                tags = " ".join(str(tag) for tag in record.get("tags") or [])
+                self.db.execute(
+                    "INSERT INTO search_index (rowid, name, type, tags, entry) VALUES (?, ?, ?, ?, ?)",
+                    (rowid, name, kind, tags, strip_html(record.get("entry"))),
+                )
+
+    def remove(self, campaign_id: int, entity_type: str, object_id: int):
+        rowid = self._rowid(campaign_id, entity_type, object_id)
+        if rowid is None:
+            return
+        with self.db:
+            self.db.execute("DELETE FROM search_index WHERE rowid = ?", (rowid,))
+            self.db.execute("DELETE FROM search_docs WHERE rowid = ?", (rowid,))
+
+    def _rowid(self, campaign_id: int, entity_type: str, object_id: int):
+        row = self.db.execute(
+            "SELECT rowid FROM search_docs WHERE campaign_id = ? AND entity_type = ? AND object_id = ?",
+            (campaign_id, entity_type, object_id),
+        ).fetchone()
+        return row[0] if row else None
+
+    def count(self, campaign_id: int) -> int:
+        return self.db.execute(
+            "SELECT count(*) FROM search_docs WHERE campaign_id = ?", (campaign_id,)
+        ).fetchone()[0]
+
+    def search(self, campaign_id: int, query: str, entity_types=None, limit: int = 20) -> list:
+        """Return the best matches for `query`, best first, with entry snippets."""
+        expression = _match_expression(query)
+        if not expression:
+            return []
+        sql = f"""
+            SELECT d.entity_type, d.object_id, d.entity_id, f.name, f.type,
+                   snippet(search_index, 3, '[', ']', '...', 16),
+                   bm25(search_index, {", ".join(map(str, _WEIGHTS))}) AS score
+            FROM search_index f JOIN search_docs d ON d.rowid = f.rowid
+            WHERE search_index MATCH ? AND d.campaign_id = ?"""
+        args = [expression, campaign_id]
+        if entity_types:
+            sql += f" AND d.entity_type IN ({', '.join('?' for _ in entity_types)})"
+            args.extend(entity_types)
+        sql += " ORDER BY score LIMIT ?"
+        args.append(limit)
+        return [
+            {
+                "entity_type": entity_type,
+                "id": object_id,
+                "entity_id": entity_id,
+                "name": name,
+                "type": kind,
+                "snippet": snippet,
+                "score": round(-score, 3),
+            }
+            for entity_type, object_id, entity_id, name, kind, snippet, score in self.db.execute(sql, args)
+        ]
+
+    def close(self):
+        self.db.close()
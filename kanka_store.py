@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import time
+from kanka_cache import parse_path
+from kanka_sync import SYNC_TYPES, ObservingStore, parse_timestamp, store_type
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    campaign_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    entity_id INTEGER,
+    name TEXT,
+    updated_at TEXT,
+    fetched_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (campaign_id, type, id)
+);
+CREATE INDEX IF NOT EXISTS entities_updated ON entities (campaign_id, type, updated_at);
+CREATE INDEX IF NOT EXISTS entities_fetched ON entities (fetched_at);
+CREATE TABLE IF NOT EXISTS sync_state (
+    campaign_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    last_sync TEXT,
+    synced_at REAL,
+    PRIMARY KEY (campaign_id, type)
+);
+"""
+
+
+def _timestamp_key(value: str) -> str:
+    """Normalise a timestamp to Kanka's format so it sorts as text."""
+    return parse_timestamp(value).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class SqliteStore(ObservingStore):
+    """On-disk mirror of campaign entities in SQLite (WAL mode).
+
+    Holds the same data as `MemoryStore` but survives restarts. Single-entity
+    reads are served from disk while the record is fresh: fetched within
+    `max_age` seconds, or covered by a sync of its type within that window.
+
+    Configuration through environment variables:
+        KANKA_STORE_PATH: Path of the SQLite database; enables the store when set
+        KANKA_STORE_MAX_AGE: Seconds a stored record is served without asking Kanka (default 300)
+    """
+
+    def __init__(self, path: str, max_age: float = None):
+        if max_age is None:
+            max_age = float(os.getenv("KANKA_STORE_MAX_AGE", "300"))
+        self.path = path
+        self.max_age = max_age
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        self.local_reads = 0
+
+    def upsert(self, campaign_id: int, entity_type: str, records: list):
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        campaign_id, entity_type, record["id"], record.get("entity_id"),
+                        record.get("name"), record.get("updated_at"), now, json.dumps(record),
+                    )
+                    for record in records
+                ],
+            )
+
+    def prune(self, campaign_id: int, entity_type: str, keep_ids: set):
+        stored = self.db.execute(
+            "SELECT id FROM entities WHERE campaign_id = ? AND type = ?", (campaign_id, entity_type)
+        )
+        stale = [(campaign_id, entity_type, row[0]) for row in stored if row[0] not in keep_ids]
+        with self.db:
+            self.db.executemany("DELETE FROM entities WHERE campaign_id = ? AND type = ? AND id = ?", stale)
+
+    def remove(self, campaign_id: int, entity_type: str, object_id: int):
+        with self.db:
+            self.db.execute(
+                "DELETE FROM entities WHERE campaign_id = ? AND type = ? AND id = ?",
+                (campaign_id, entity_type, object_id),
+            )
+
+    def get(self, campaign_id: int, entity_type: str, object_id: int):
+        row = self.db.execute(
+            "SELECT data FROM entities WHERE campaign_id = ? AND type = ? AND id = ?",
+            (campaign_id, entity_type, object_id),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self, campaign_id: int, entity_type: str) -> list:
+        rows = self.db.execute(
+            "SELECT data FROM entities WHERE campaign_id = ? AND type = ? ORDER BY id",
+            (campaign_id, entity_type),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def count(self, campaign_id: int, entity_type: str) -> int:
+        return self.db.execute(
+            "SELECT count(*) FROM entities WHERE campaign_id = ? AND type = ?", (campaign_id, entity_type)
+        ).fetchone()[0]
+
+    def last_sync(self, campaign_id: int, entity_type: str):
+        row = self.db.execute(
+            "SELECT last_sync FROM sync_state WHERE campaign_id = ? AND type = ?", (campaign_id, entity_type)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_last_sync(self, campaign_id: int, entity_type: str, timestamp: str):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                (campaign_id, entity_type, timestamp, time.time()),
+            )
+
+    def changed_since(self, campaign_id: int, since: str, entity_types=SYNC_TYPES) -> dict:
+        threshold = _timestamp_key(since)
+        changes = {}
+        for entity_type in entity_types:
+            rows = self.db.execute(
+                "SELECT data FROM entities WHERE campaign_id = ? AND type = ? AND updated_at >= ? ORDER BY updated_at",
+                (campaign_id, entity_type, threshold),
+            )
+            changes[entity_type] = [json.loads(row[0]) for row in rows]
+        return changes
+
+    def read(self, path: str, params: dict = None):
+        """Serve a single-entity GET from disk if the stored copy is fresh."""
+        if params:
+            return None
+        campaign_id, resource, object_id = parse_path(path)
+        entity_type = store_type(resource)
+        if campaign_id is None or entity_type is None or not isinstance(object_id, int):
+            return None
+        cutoff = time.time() - self.max_age
+        row = self.db.execute(
+            """SELECT e.data FROM entities e
+               LEFT JOIN sync_state s ON s.campaign_id = e.campaign_id AND s.type = e.type
+               WHERE e.campaign_id = ? AND e.type = ? AND e.id = ?
+                 AND (e.fetched_at >= ? OR s.synced_at >= ?)""",
+            (campaign_id, entity_type, object_id, cutoff, cutoff),
+        ).fetchone()
+        if row is None:
+            return None
+        self.local_reads += 1
+        return {"data": json.loads(row[0])}
+
+    def warm(self, cache, limit: int = 500) -> int:
+        """Prime the response cache with the most recently fetched fresh records."""
+        cutoff = time.time() - self.max_age
+        rows = self.db.execute(
+            "SELECT campaign_id, type, id, entity_id, data FROM entities WHERE fetched_at >= ? ORDER BY fetched_at DESC LIMIT ?",
+            (cutoff, limit),
+        ).fetchall()
+        for campaign_id, entity_type, object_id, entity_id, data in reversed(rows):
+            if entity_type == "posts":
+                path = f"campaigns/{campaign_id}/entities/{entity_id}/posts/{object_id}"
+            else:
+                path = f"campaigns/{campaign_id}/{entity_type}/{object_id}"
+            cache.put(cache.key(path), {"data": json.loads(data)})
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "max_age": self.max_age,
+            "entities": self.db.execute("SELECT count(*) FROM entities").fetchone()[0],
+            "local_reads": self.local_reads,
+        }
+
+    def close(self):
+        self.db.close()
+
+
+def open_store(path: str = None):
+    """Open the SQLite store at `path` (default KANKA_STORE_PATH), or return None."""
+    path = path or os.getenv("KANKA_STORE_PATH")
+    return SqliteStore(path) if path else None
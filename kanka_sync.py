@@ -0,0 +1,151 @@
+import asyncio
+from datetime import datetime, timezone
+from kanka_cache import parse_path
+from kanka_ratelimit import PRIORITY_BULK
+
+# Entity types kept in the local store by `SyncEngine`.
+SYNC_TYPES = ("characters", "locations", "notes", "journals")
+# Entity types a store mirrors from the client's responses.
+STORE_TYPES = SYNC_TYPES + ("posts",)
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse a Kanka timestamp ("2024-01-28T20:26:07.000000Z") or ISO date."""
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def store_type(resource: str):
+    """Map a cache resource ("characters", "entities/5/posts") to a store type."""
+    entity_type = resource.rsplit("/", 1)[-1]
+    return entity_type if entity_type in STORE_TYPES else None
+
+
+class ObservingStore:
+    """Mirrors the client's entity responses into a store.
+
+    Registered as a client observer, it upserts every character, location,
+    note, journal and post the client reads or writes, and removes deleted
+    ones, so the store stays current between syncs.
+    """
+
+    def observe(self, method: str, path: str, params: dict, result):
+        campaign_id, resource, object_id = parse_path(path)
+        entity_type = store_type(resource)
+        if campaign_id is None or entity_type is None:
+            return
+        if method == "DELETE":
+            if object_id is not None:
+                self.remove(campaign_id, entity_type, object_id)
+            return
+        data = (result or {}).get("data")
+        if isinstance(data, dict):
+            data = [data]
+        if data:
+            self.upsert(campaign_id, entity_type, [record for record in data if "id" in record])
+
+
+class MemoryStore(ObservingStore):
+    """Local copy of synced entities, grouped by campaign and entity type."""
+
+    def __init__(self):
+        self._entities = {}
+        self._last_sync = {}
+
+    def upsert(self, campaign_id: int, entity_type: str, records: list):
+        entities = self._entities.setdefault((campaign_id, entity_type), {})
+        for record in records:
+            entities[record["id"]] = record
+
+    def prune(self, campaign_id: int, entity_type: str, keep_ids: set):
+        """Drop stored entities of a type that are not in `keep_ids`."""
+        entities = self._entities.get((campaign_id, entity_type), {})
+        for object_id in [object_id for object_id in entities if object_id not in keep_ids]:
+            del entities[object_id]
+
+    def remove(self, campaign_id: int, entity_type: str, object_id: int):
+        self._entities.get((campaign_id, entity_type), {}).pop(object_id, None)
+
+    def get(self, campaign_id: int, entity_type: str, object_id: int):
+        return self._entities.get((campaign_id, entity_type), {}).get(object_id)
+
+    def all(self, campaign_id: int, entity_type: str) -> list:
+        return list(self._entities.get((campaign_id, entity_type), {}).values())
+
+    def count(self, campaign_id: int, entity_type: str) -> int:
+        return len(self._entities.get((campaign_id, entity_type), {}))
+
+    def last_sync(self, campaign_id: int, entity_type: str):
+        return self._last_sync.get((campaign_id, entity_type))
+
+    def set_last_sync(self, campaign_id: int, entity_type: str, timestamp: str):
+        self._last_sync[(campaign_id, entity_type)] = timestamp
+
+    def changed_since(self, campaign_id: int, since: str, entity_types=SYNC_TYPES) -> dict:
+        """Return stored entities whose `updated_at` is at or after `since`."""
+        threshold = parse_timestamp(since)
+        changes = {}
+        for entity_type in entity_types:
+            changes[entity_type] = [
+                record for record in self.all(campaign_id, entity_type)
+                if record.get("updated_at") and parse_timestamp(record["updated_at"]) >= threshold
+            ]
+        return changes
+
+
+class SyncEngine:
+    """Keeps a local store up to date using Kanka's `lastSync` parameter.
+
+    The first sync of a campaign and entity type lists everything; later syncs
+    only ask Kanka for entities changed since the previous sync and merge them
+    into the store. A full sync also drops entities deleted upstream, which
+    `lastSync` deltas cannot report.
+    """
+
+    def __init__(self, client, store=None):
+        self.client = client
+        if store is None:
+            store = client.store if client.store is not None else MemoryStore()
+        self.store = store
+        if store not in client.observers:
+            client.observers.append(store)
+
+    async def sync(self, campaign_id: int, entity_types=None, full: bool = False) -> dict:
+        entity_types = entity_types or SYNC_TYPES
+        results = await asyncio.gather(*(
+            self.sync_type(campaign_id, entity_type, full) for entity_type in entity_types
+        ))
+        return dict(zip(entity_types, results))
+
+    async def sync_type(self, campaign_id: int, entity_type: str, full: bool = False) -> dict:
+        last_sync = None if full else self.store.last_sync(campaign_id, entity_type)
+        params = {"lastSync": last_sync} if last_sync else {}
+        started = utc_now()
+        marker = None
+        seen = set()
+        path = f"campaigns/{campaign_id}/{entity_type}"
+        # Pages reach the store through its client observer; only the IDs are
+        # tracked here to prune deletions after a full listing.
+        async for page in self.client.iter_pages(path, params, use_cache=False, priority=PRIORITY_BULK):
+            marker = marker or page.get("sync")
+            seen.update(record["id"] for record in page.get("data") or [])
+        if not last_sync:
+            self.store.prune(campaign_id, entity_type, seen)
+        self.store.set_last_sync(campaign_id, entity_type, marker or started)
+        if last_sync:
+            for object_id in seen:
+                self.client.cache.invalidate(campaign_id, entity_type, object_id)
+        else:
+            self.client.cache.invalidate_resource(campaign_id, entity_type)
+        return {
+            "mode": "delta" if last_sync else "full",
+            "changed": len(seen),
+            "stored": self.store.count(campaign_id, entity_type),
+            "last_sync": self.store.last_sync(campaign_id, entity_type),
+        }
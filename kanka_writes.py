@@ -0,0 +1,224 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from collections import deque
+import httpx
+from kanka_cache import parse_path
+
+# Results kept for flush_writes between two calls.
+MAX_RESULTS = 1000
+# Sends of one write before it is given up as failed.
+MAX_ATTEMPTS = 5
+# Seconds between the attempts made inline when the queue is closed.
+CLOSE_RETRY_DELAY = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+def write_behind_window():
+    """Seconds updates are held for coalescing (KANKA_WRITE_BEHIND), or None when write-behind is off."""
+    window = float(os.getenv("KANKA_WRITE_BEHIND") or 0)
+    return window if window > 0 else None
+
+
+def _retriable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class _Pending:
+    __slots__ = ("payload", "write_ids", "queued_at", "attempts")
+
+    def __init__(self):
+        self.payload = {}
+        self.write_ids = []
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+
+
+class WriteBehindQueue:
+    """Holds updates briefly and sends the successive edits of an entity as one request.
+
+    `patch` takes the place of `KankaClient.patch` for the update tools: the
+    fields are merged into the entity's pending write (later values win) and
+    the call returns at once. The merged write is sent `window` seconds after
+    the first queued edit, when `flush` is called, before the entity or its
+    list is read through the client, and when the workspace shuts down.
+    Every sent write is recorded with the IDs of the edits it carried, so
+    `drain` can confirm which edits Kanka accepted. Writes failing with a 429,
+    a 5xx or a network error are queued again, up to `MAX_ATTEMPTS` sends;
+    other failures are reported and dropped. Writes to one entity are never
+    sent concurrently. `close` retries what is left inline and logs every
+    write it could not send, with its fields, as an error.
+    """
+
+    def __init__(self, client, window: float):
+        self.client = client
+        self.window = window
+        self.pending = {}
+        self.results = deque(maxlen=MAX_RESULTS)
+        self._timers = {}
+        self._locks = {}
+        self._tasks = set()
+        self._ids = itertools.count(1)
+        self.queued = 0
+        self.merged = 0
+        self.sent = 0
+        self.failed = 0
+        self.closing = False
+
+    async def patch(self, path: str, data: dict, priority: int = None) -> dict:
+        entry = self.pending.get(path)
+        if entry is None:
+            entry = self.pending[path] = _Pending()
+            self._schedule(path, self.window)
+        else:
+            self.merged += 1
+        write_id = next(self._ids)
+        entry.payload.update(data)
+        entry.write_ids.append(write_id)
+        self.queued += 1
+        return {
+            "queued": True,
+            "write_id": write_id,
+            "pending_fields": dict(entry.payload),
+            "flush_in": round(max(0.0, entry.queued_at + self.window - time.monotonic()), 2),
+        }
+
+    def _schedule(self, path: str, delay: float):
+        loop = asyncio.get_running_loop()
+        self._timers[path] = loop.call_later(delay, self._flush_soon, path)
+
+    def _flush_soon(self, path: str):
+        self._timers.pop(path, None)
+        task = asyncio.ensure_future(self.flush_path(path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush_path(self, path: str, priority: int = None):
+        """Send the pending write of one entity; returns its result, or None if nothing was pending."""
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            timer = self._timers.pop(path, None)
+            if timer is not None:
+                timer.cancel()
+            entry = self.pending.pop(path, None)
+            if entry is None:
+                result = None
+            else:
+                result = await self._send(path, entry, priority)
+        if not lock.locked() and path not in self.pending:
+            self._locks.pop(path, None)
+        return result
+
+    async def _send(self, path: str, entry: _Pending, priority: int):
+        entry.attempts += 1
+        try:
+            response = await self.client.patch(path, entry.payload, priority)
+        except Exception as error:
+            self.failed += 1
+            result = {
+                "status": "failed",
+                "path": path,
+                "write_ids": entry.write_ids,
+                "fields": sorted(entry.payload),
+                "error": str(error),
+                "attempts": entry.attempts,
+            }
+            if _retriable(error) and entry.attempts < MAX_ATTEMPTS:
+                # Keep the edits, under any made since, and try again after another window.
+                newer = self.pending.get(path)
+                if newer is not None:
+                    entry.payload.update(newer.payload)
+                    entry.write_ids += newer.write_ids
+                elif not self.closing:
+                    self._schedule(path, self.window)
+                self.pending[path] = entry
+                result["status"] = "retrying"
+            else:
+                self._log_unsent(path, entry, error)
+            self.results.append(result)
+            return result
+        self.sent += 1
+        record = (response or {}).get("data") or {}
+        result = {
+            "status": "written",
+            "path": path,
+            "write_ids": entry.write_ids,
+            "fields": sorted(entry.payload),
+            "updated_at": record.get("updated_at"),
+        }
+        self.results.append(result)
+        return result
+
+    async def flush(self, priority: int = None) -> list:
+        """Send every pending write now."""
+        results = await asyncio.gather(*(self.flush_path(path, priority) for path in list(self.pending)))
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        return [result for result in results if result is not None]
+
+    async def close(self):
+        """Send every pending write before shutting down, retrying inline; unsent writes are logged."""
+        self.closing = True
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        await self.flush()
+        while self.pending:
+            await asyncio.sleep(CLOSE_RETRY_DELAY)
+            await self.flush()
+
+    @staticmethod
+    def _log_unsent(path: str, entry: _Pending, error: Exception):
+        logger.error(
+            "Write-behind update of %s not saved after %d attempts (%s); lost edits %s: %s",
+            path, entry.attempts, error, entry.write_ids, json.dumps(entry.payload, ensure_ascii=False, default=str),
+        )
+
+    async def flush_related(self, path: str):
+        """Send the pending writes a read of `path` would otherwise miss."""
+        if not self.pending:
+            return
+        campaign_id, resource, object_id = parse_path(path)
+        related = []
+        for pending_path in self.pending:
+            pending_campaign, pending_resource, pending_id = parse_path(pending_path)
+            if (pending_campaign, pending_resource) == (campaign_id, resource) and object_id in (None, pending_id):
+                related.append(pending_path)
+        await asyncio.gather(*(self.flush_path(pending_path) for pending_path in related))
+
+    def discard(self, path: str):
+        """Drop the pending write of a deleted entity."""
+        timer = self._timers.pop(path, None)
+        if timer is not None:
+            timer.cancel()
+        entry = self.pending.pop(path, None)
+        if entry is not None:
+            self.results.append({
+                "status": "discarded",
+                "path": path,
+                "write_ids": entry.write_ids,
+                "fields": sorted(entry.payload),
+                "error": "the entity was deleted",
+            })
+
+    def drain(self) -> list:
+        """Return and forget the results recorded since the previous call."""
+        results = list(self.results)
+        self.results.clear()
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "window": self.window,
+            "pending": len(self.pending),
+            "queued": self.queued,
+            "merged": self.merged,
+            "sent": self.sent,
+            "failed": self.failed,
+        }
@@ -0,0 +1,66 @@
+import types
+import pytest
+from starlette.requests import Request
+import kanka_mcp
+
+
+class Session:
+    """Stands in for an MCP server session, which keys are remembered by."""
+
+
+@pytest.fixture
+def call(monkeypatch):
+    """Make get_context() describe a tool call of `session`, over HTTP with `headers` or over stdio."""
+    monkeypatch.setenv("KANKA_API_KEY", "operator-key")
+    monkeypatch.delenv("KANKA_HTTP_SHARED_KEY", raising=False)
+
+    def start(session, headers=None):
+        request = None
+        if headers is not None:
+            raw = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+            request = Request({"type": "http", "method": "POST", "path": "/mcp", "headers": raw})
+        context = types.SimpleNamespace(session=session, request_context=types.SimpleNamespace(request=request))
+        monkeypatch.setattr(kanka_mcp.mcp, "get_context", lambda: context)
+        return kanka_mcp.get_api_key()
+
+    return start
+
+
+def test_header_key_comes_before_bearer_token(call):
+    headers = {"X-Kanka-Api-Key": "header-key", "Authorization": "Bearer bearer-key"}
+
+    assert call(Session(), headers) == "header-key"
+
+
+def test_bearer_token_is_used_without_the_header(call):
+    assert call(Session(), {"Authorization": "Bearer bearer-key"}) == "bearer-key"
+
+
+def test_session_reuses_the_last_key_it_sent(call):
+    session = Session()
+    call(session, {"X-Kanka-Api-Key": "first-key"})
+    call(session, {"Authorization": "Bearer second-key"})
+
+    assert call(session, {}) == "second-key"
+    with pytest.raises(EnvironmentError, match="No Kanka API key"):
+        call(Session(), {})
+
+
+def test_keyless_http_request_is_rejected_despite_the_env_key(call):
+    with pytest.raises(EnvironmentError, match="No Kanka API key"):
+        call(Session(), {"Authorization": "Basic dXNlcjpwYXNz"})
+
+
+def test_env_key_serves_http_only_when_shared(call, monkeypatch):
+    monkeypatch.setenv("KANKA_HTTP_SHARED_KEY", "1")
+
+    assert call(Session(), {}) == "operator-key"
+    assert call(Session(), {"X-Kanka-Api-Key": "own-key"}) == "own-key"
+
+
+def test_stdio_uses_the_env_key(call, monkeypatch):
+    assert call(Session()) == "operator-key"
+
+    monkeypatch.delenv("KANKA_API_KEY")
+    with pytest.raises(EnvironmentError, match="KANKA_API_KEY"):
+        call(Session())
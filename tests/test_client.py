@@ -0,0 +1,276 @@
+import asyncio
+import json
+import httpx
+import pytest
+from kanka_client import KankaClient, decode_cursor, encode_cursor
+
+
+class FakeKanka:
+    """Kanka API double behind an httpx.MockTransport, holding characters of campaign 1."""
+
+    def __init__(self, characters=None):
+        self.characters = {record["id"]: dict(record) for record in characters or ()}
+        self.requests = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        last = request.url.path.rsplit("/", 1)[-1]
+        if not last.isdigit():
+            return self.list(request)
+        record = self.characters[int(last)]
+        if request.method == "PATCH":
+            record.update(json.loads(request.content))
+        return httpx.Response(200, json={"data": record})
+
+    def list(self, request: httpx.Request) -> httpx.Response:
+        """Serve a page the way Kanka does: `limit` sets the page size, `meta` describes the list."""
+        records = [self.characters[object_id] for object_id in sorted(self.characters)]
+        page = int(request.url.params.get("page", 1))
+        per_page = int(request.url.params.get("limit", 15))
+        meta = {"current_page": page, "per_page": per_page, "total": len(records), "last_page": max(1, -(-len(records) // per_page))}
+        return httpx.Response(200, json={"data": records[(page - 1) * per_page:page * per_page], "meta": meta})
+
+    def pages_requested(self) -> list:
+        return sorted(int(request.url.params["page"]) for request in self.requests if "page" in request.url.params)
+
+    def client(self) -> KankaClient:
+        return KankaClient("key", base_url="https://kanka.test/1.0", transport=httpx.MockTransport(self.handle))
+
+
+PATH = "campaigns/1/characters/7"
+
+
+def test_patch_sends_every_given_field_after_an_edit_elsewhere():
+    kanka = FakeKanka([{"id": 7, "name": "Aria", "title": None, "age": None}])
+
+    async def scenario():
+        client = kanka.client()
+        await client.patch(PATH, {"title": "Captain"})
+        kanka.characters[7]["title"] = "Deserter"  # edited in the web UI meanwhile
+        await client.patch(PATH, {"title": "Captain", "age": "31"})
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+    assert json.loads(kanka.requests[-1].content) == {"title": "Captain", "age": "31"}
+    assert kanka.characters[7]["title"] == "Captain" and kanka.characters[7]["age"] == "31"
+
+
+def test_patch_with_unchanged_values_is_still_sent():
+    kanka = FakeKanka([{"id": 7, "name": "Aria", "is_dead": False}])
+
+    async def scenario():
+        client = kanka.client()
+        await client.patch(PATH, {"is_dead": False})
+        kanka.characters[7]["is_dead"] = True
+        result = await client.patch(PATH, {"is_dead": False})
+        await client.aclose()
+        return result
+
+    result = asyncio.run(scenario())
+
+    assert [request.method for request in kanka.requests] == ["PATCH", "PATCH"]
+    assert result["data"]["is_dead"] is False and kanka.characters[7]["is_dead"] is False
+
+
+LIST = "campaigns/1/characters"
+
+
+def numbered(count: int) -> FakeKanka:
+    return FakeKanka([{"id": number, "name": f"Character {number}"} for number in range(1, count + 1)])
+
+
+def ids(result: dict) -> list:
+    return [record["id"] for record in result["data"]]
+
+
+def test_cursor_round_trips():
+    cursor = encode_cursor(3, 7, 10)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == {"page": 3, "offset": 7, "limit": 10}
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor!", encode_cursor(1, 0, 10)[:-3], "eyJwYWdlIjogMX0"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_paginate_rejects_an_invalid_cursor_before_any_request():
+    kanka = numbered(5)
+
+    async def scenario():
+        client = kanka.client()
+        try:
+            with pytest.raises(ValueError, match="Invalid cursor"):
+                await client.paginate(LIST, cursor="garbage")
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+    assert kanka.requests == []
+
+
+def test_single_page_returns_that_page_only():
+    kanka = numbered(40)
+
+    async def scenario():
+        client = kanka.client()
+        try:
+            return await client.paginate(LIST, page=2, limit=15)
+        finally:
+            await client.aclose()
+
+    result = asyncio.run(scenario())
+    assert ids(result) == list(range(16, 31))
+    assert result["meta"] == {"total": 40, "per_page": 15, "last_page": 3, "from_page": 2, "to_page": 2, "returned": 15}
+    assert decode_cursor(result["next_cursor"]) == {"page": 3, "offset": 0, "limit": 15}
+    assert kanka.pages_requested() == [2]
+
+
+def test_max_items_stops_mid_page_and_the_cursor_resumes_there():
+    kanka = numbered(40)
+
+    async def scenario():
+        client = kanka.client()
+        try:
+            first = await client.paginate(LIST, limit=15, max_items=20)
+            second = await client.paginate(LIST, cursor=first["next_cursor"], max_items=20)
+            return first, second
+        finally:
+            await client.aclose()
+
+    first, second = asyncio.run(scenario())
+    assert ids(first) == list(range(1, 21))
+    assert first["meta"]["to_page"] == 2
+    assert decode_cursor(first["next_cursor"]) == {"page": 2, "offset": 5, "limit": 15}
+    assert ids(second) == list(range(21, 41))
+    assert second["meta"]["from_page"] == 2 and second["meta"]["to_page"] == 3
+    assert second["next_cursor"] is None
+
+
+def test_following_cursors_visits_every_item_once():
+    kanka = numbered(40)
+
+    async def scenario():
+        client = kanka.client()
+        try:
+            seen, cursor, calls = [], None, 0
+            while True:
+                result = await client.paginate(LIST, limit=15, max_items=7, cursor=cursor)
+                seen.extend(ids(result))
+                calls += 1
+                cursor = result["next_cursor"]
+                if cursor is None:
+                    return seen, calls
+        finally:
+            await client.aclose()
+
+    seen, calls = asyncio.run(scenario())
+    assert seen == list(range(1, 41))
+    assert calls == 6
+
+
+def test_last_page_ends_without_a_cursor():
+    kanka = numbered(40)
+
+    async def scenario():
+        client = kanka.client()
+        try:
+            everything = await client.paginate(LIST, limit=15, max_items=100)
+            last = await client.paginate(LIST, page=3, limit=15)
+            return everything, last
+        finally:
+            await client.aclose()
+
+    everything, last = asyncio.run(scenario())
+    assert ids(everything) == list(range(1, 41))
+    assert everything["meta"]["to_page"] == 3 and everything["next_cursor"] is None
+    assert ids(last) == list(range(31, 41))
+    assert last["next_cursor"] is None
+
+
+def test_iter_pages_yields_every_page_in_order():
+    kanka = numbered(40)
+
+    async def scenario():
+        client = kanka.client()
+        client.campaign_concurrency = 1
+        try:
+            return [page async for page in client.iter_pages(LIST, {"limit": 7})]
+        finally:
+            await client.aclose()
+
+    pages = asyncio.run(scenario())
+    assert [page["meta"]["current_page"] for page in pages] == [1, 2, 3, 4, 5, 6]
+    assert [record["id"] for page in pages for record in page["data"]] == list(range(1, 41))
+
+
+def test_iter_pages_starts_at_the_given_page():
+    kanka = numbered(40)
+
+    async def scenario():
+        client = kanka.client()
+        try:
+            return [page async for page in client.iter_pages(LIST, {"limit": 15}, start_page=2)]
+        finally:
+            await client.aclose()
+
+    pages = asyncio.run(scenario())
+    assert [record["id"] for page in pages for record in page["data"]] == list(range(16, 41))
+    assert kanka.pages_requested() == [2, 3]
+
+
+class GatedKanka(FakeKanka):
+    """FakeKanka whose GETs read the record on arrival but answer only once `release` is set."""
+
+    def __init__(self, characters=None):
+        super().__init__(characters)
+        self.arrived = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        response = super().handle(request)
+        if request.method == "GET":
+            self.arrived.set()
+            await self.release.wait()
+        return response
+
+
+def test_concurrent_identical_gets_share_one_request():
+    async def scenario():
+        kanka = GatedKanka([{"id": 7, "name": "Aria"}])
+        client = kanka.client()
+        try:
+            readers = [asyncio.create_task(client.get(PATH)) for _ in range(3)]
+            await kanka.arrived.wait()
+            await asyncio.sleep(0)
+            kanka.release.set()
+            return kanka, client.coalesced, await asyncio.gather(*readers)
+        finally:
+            await client.aclose()
+
+    kanka, coalesced, results = asyncio.run(scenario())
+    assert [request.method for request in kanka.requests] == ["GET"]
+    assert coalesced == 2
+    assert results == [{"data": {"id": 7, "name": "Aria"}}] * 3
+
+
+def test_write_during_an_in_flight_get_keeps_stale_data_out_of_the_cache():
+    async def scenario():
+        kanka = GatedKanka([{"id": 7, "name": "Aria"}])
+        client = kanka.client()
+        try:
+            reader = asyncio.create_task(client.get(PATH))
+            await kanka.arrived.wait()
+            await client.patch(PATH, {"name": "Queen Aria"})
+            kanka.release.set()
+            in_flight = await reader
+            return in_flight, await client.get(PATH)
+        finally:
+            await client.aclose()
+
+    in_flight, after = asyncio.run(scenario())
+    assert in_flight["data"]["name"] == "Aria"
+    assert after["data"]["name"] == "Queen Aria"
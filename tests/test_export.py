@@ -0,0 +1,115 @@
+import asyncio
+import gzip
+import json
+import zlib
+import pytest
+from kanka_export import CampaignExporter, iter_export
+
+TYPES = ["characters", "locations"]
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FakeClient:
+    """Stand-in for KankaClient serving two-record pages of a campaign, posts included.
+
+    With `fail_on` set to (entity_type, page), fetching that page raises
+    Interrupted, as a dropped connection or a killed process would.
+    """
+
+    per_page = 2
+
+    def __init__(self, fail_on=None):
+        self.records = {
+            "characters": [{"id": number, "entity_id": 100 + number, "name": f"Character {number}"} for number in range(1, 6)],
+            "locations": [{"id": number, "entity_id": 200 + number, "name": f"Location {number}"} for number in range(1, 5)],
+        }
+        self.fail_on = fail_on
+        self.pages = []
+
+    async def get(self, path, params=None, use_cache=True, priority=None):
+        return {"data": {"id": 1, "name": "Campaign"}}
+
+    async def iter_pages(self, path, params=None, start_page=1, use_cache=True, priority=None):
+        parts = path.split("/")
+        if parts[-1] == "posts":
+            entity_id = int(parts[-2])
+            yield {"data": [{"id": entity_id * 10, "name": f"Post of {entity_id}"}]}
+            return
+        entity_type = parts[-1]
+        records = self.records[entity_type]
+        last_page = -(-len(records) // self.per_page)
+        for page in range(start_page, last_page + 1):
+            if (entity_type, page) == self.fail_on:
+                raise Interrupted(f"{entity_type} page {page}")
+            self.pages.append((entity_type, page))
+            data = records[(page - 1) * self.per_page:page * self.per_page]
+            yield {"data": data, "meta": {"current_page": page, "last_page": last_page}}
+
+
+def export(path, client, resume=True, compression=None):
+    return asyncio.run(CampaignExporter(client, 1, str(path), compression, entity_types=TYPES).run(resume))
+
+
+def names(path):
+    return [line["data"]["name"] for line in iter_export(str(path))]
+
+
+@pytest.mark.parametrize("filename", ["campaign.ndjson", "campaign.ndjson.gz"])
+def test_resumed_export_matches_an_uninterrupted_one(tmp_path, filename):
+    expected = tmp_path / f"expected-{filename}"
+    export(expected, FakeClient())
+    path = tmp_path / filename
+
+    with pytest.raises(Interrupted):
+        export(path, FakeClient(fail_on=("locations", 2)))
+    checkpoint = json.loads((tmp_path / f"{filename}.checkpoint").read_text())
+    assert (checkpoint["entity_type"], checkpoint["next_page"]) == ("locations", 2)
+    with open(path, "ab") as file:
+        file.write(b"half a page")  # a write cut short by the interruption
+
+    client = FakeClient()
+    result = export(path, client)
+
+    assert result["resumed"] is True
+    assert client.pages == [("locations", 2)]
+    assert names(path) == names(expected)
+    assert result["counts"] == {"characters": 5, "locations": 4, "posts": 9}
+    assert not (tmp_path / f"{filename}.checkpoint").exists()
+
+
+def test_export_without_resume_starts_over(tmp_path):
+    path = tmp_path / "campaign.ndjson"
+    with pytest.raises(Interrupted):
+        export(path, FakeClient(fail_on=("characters", 3)))
+
+    client = FakeClient()
+    result = export(path, client, resume=False)
+
+    assert result["resumed"] is False
+    assert client.pages[0] == ("characters", 1)
+    assert names(path).count("Character 1") == 1
+
+
+def test_gzip_export_is_one_member_per_page(tmp_path):
+    path = tmp_path / "campaign.ndjson.gz"
+    with pytest.raises(Interrupted):
+        export(path, FakeClient(fail_on=("locations", 1)))
+    offset = json.loads((tmp_path / "campaign.ndjson.gz.checkpoint").read_text())["offset"]
+    data = path.read_bytes()
+
+    # The file so far is complete on its own: the campaign line and three pages of characters.
+    assert offset == len(data)
+    lines = gzip.decompress(data).decode("utf-8").splitlines()
+    assert [json.loads(line)["type"] for line in lines].count("characters") == 5
+
+    members = 0
+    while data:
+        decompressor = zlib.decompressobj(31)
+        decompressor.decompress(data)
+        assert decompressor.eof
+        data = decompressor.unused_data
+        members += 1
+    assert members == 4
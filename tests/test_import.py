@@ -0,0 +1,174 @@
+import asyncio
+import json
+import pytest
+from kanka_import import CampaignImporter, _Existing
+from kanka_schema import SCHEMAS
+from kanka_sync import MemoryStore
+
+
+class FakeLimiter:
+    per_minute = 60
+
+
+class FakeClient:
+    """In-memory stand-in for KankaClient serving the typed list, create and update endpoints."""
+
+    def __init__(self, records=None):
+        self.records = {entity_type: dict(rows) for entity_type, rows in (records or {}).items()}
+        self.writes = []
+        self.requests_sent = 0
+        self.limiter = FakeLimiter()
+        self._next_id = 1000
+
+    async def iter_pages(self, path, params=None, start_page=1, use_cache=True, priority=None):
+        self.requests_sent += 1
+        entity_type = path.rsplit("/", 1)[-1]
+        yield {"data": list(self.records.get(entity_type, {}).values())}
+
+    async def post(self, path, data, priority=None):
+        self.requests_sent += 1
+        self.writes.append(("POST", path, data))
+        self._next_id += 1
+        record = {**data, "id": self._next_id, "entity_id": self._next_id + 5000}
+        self.records.setdefault(path.rsplit("/", 1)[-1], {})[record["id"]] = record
+        return {"data": record}
+
+    async def patch(self, path, data, priority=None):
+        self.requests_sent += 1
+        self.writes.append(("PATCH", path, data))
+        entity_type, object_id = path.rsplit("/", 2)[-2:]
+        record = self.records[entity_type][int(object_id)]
+        record.update(data)
+        return {"data": record}
+
+
+ARIA = {"id": 1, "entity_id": 11, "name": "Aria", "title": "Bard", "age": "30"}
+
+
+def run_import(tmp_path, rows, records=None, **options):
+    path = tmp_path / "rows.ndjson"
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+    client = FakeClient(records if records is not None else {"characters": {1: dict(ARIA)}})
+    importer = CampaignImporter(client, 1, entity_type="characters", **options)
+    return client, asyncio.run(importer.run(str(path)))
+
+
+def test_plan_folds_rows_of_one_entity_into_one_update():
+    importer = CampaignImporter(FakeClient(), 1)
+    existing = _Existing()
+    existing.add(dict(ARIA))
+    schema = SCHEMAS["characters"]
+
+    first, target = importer._plan(1, schema, existing, {"name": "Aria", "title": "Queen"})
+    second, _ = importer._plan(2, schema, existing, {"name": "Aria", "age": "31"})
+
+    assert first.action == "update" and first.object_id == 1
+    assert second is None
+    assert first.payload == {"title": "Queen", "age": "31"}
+    assert target["title"] == "Queen"
+    assert importer.counts == {"merged": 1}
+
+
+def test_plan_drops_changes_undone_by_a_later_row():
+    importer = CampaignImporter(FakeClient(), 1)
+    existing = _Existing()
+    existing.add(dict(ARIA))
+    schema = SCHEMAS["characters"]
+
+    operation, _ = importer._plan(1, schema, existing, {"name": "Aria", "title": "Queen", "age": "31"})
+    importer._plan(2, schema, existing, {"name": "Aria", "title": "Bard"})
+
+    assert operation.payload == {"age": "31"}
+
+
+def test_plan_merges_repeated_new_rows_into_one_create():
+    importer = CampaignImporter(FakeClient(), 1)
+    existing = _Existing()
+    schema = SCHEMAS["characters"]
+
+    operation, placeholder = importer._plan(1, schema, existing, {"name": "Brom", "title": "Smith"})
+    again, target = importer._plan(2, schema, existing, {"name": "Brom", "title": "Master smith"})
+
+    assert operation.action == "create" and again is None
+    assert target is placeholder
+    assert operation.payload == {"name": "Brom", "title": "Master smith"}
+
+
+def test_identical_and_folded_rows_send_one_write(tmp_path):
+    rows = [
+        {"name": "Aria", "title": "Bard"},
+        {"name": "Aria", "title": "Queen"},
+        {"name": "Aria", "age": "31"},
+        {"name": "Brom"},
+    ]
+    client, result = run_import(tmp_path, rows)
+
+    assert result["errors"] == []
+    assert result["counts"] == {"unchanged": 1, "update": 1, "merged": 1, "create": 1}
+    assert sorted(write[0] for write in client.writes) == ["PATCH", "POST"]
+    patch = next(write for write in client.writes if write[0] == "PATCH")
+    assert patch[2] == {"title": "Queen", "age": "31"}
+
+
+def test_dry_run_writes_nothing(tmp_path):
+    client, result = run_import(tmp_path, [{"name": "Aria", "title": "Queen"}, {"name": "Brom"}], dry_run=True)
+
+    assert client.writes == []
+    assert [operation["action"] for operation in result["operations"]] == ["update", "create"]
+    assert result["cost"]["write_requests"] == 2
+
+
+class StoreBackedClient(FakeClient):
+    """Lists records straight out of a MemoryStore, sharing its dicts as the cache and sync do."""
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+    async def iter_pages(self, path, params=None, start_page=1, use_cache=True, priority=None):
+        self.requests_sent += 1
+        yield {"data": self.store.all(1, path.rsplit("/", 1)[-1])}
+
+
+def test_dry_run_leaves_fetched_records_unchanged(tmp_path):
+    store = MemoryStore()
+    store.upsert(1, "characters", [dict(ARIA)])
+    path = tmp_path / "rows.csv"
+    path.write_text("name,title\nAria,Emperor\nAria,Emperor\n", encoding="utf-8")
+    client = StoreBackedClient(store)
+
+    result = asyncio.run(CampaignImporter(client, 1, entity_type="characters", dry_run=True).run(str(path)))
+
+    assert result["operations"][0]["changes"] == ["title"]
+    assert store.get(1, "characters", 1) == ARIA
+
+
+@pytest.mark.parametrize("bad_row, message", [
+    ({"name": 42}, "name must be a string"),
+    ({"name": "Cato", "posts": "oops"}, "posts must be a list of objects"),
+    ({"name": "Cato", "posts": ["oops"]}, "posts must be a list of objects"),
+    ([1, 2], "a row must be an object"),
+    ({"type": "posts", "entity_id": 11, "data": {"name": ["x"]}}, "name must be a string"),
+])
+def test_bad_rows_are_reported_and_the_rest_imported(tmp_path, bad_row, message):
+    rows = [{"name": "Aria", "entity_id": 11, "title": "Queen"}, bad_row, {"name": "Brom"}]
+    client, result = run_import(tmp_path, rows)
+
+    assert result["errors"] == [{"row": 2, "error": message}]
+    assert result["counts"]["errors"] == 1
+    assert result["counts"]["update"] == 1 and result["counts"]["create"] == 1
+    assert len(client.writes) == 2
+
+
+def test_malformed_ndjson_line_is_reported_and_the_rest_imported(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    path.write_text('{"name": "Aria", "title": "Queen"}\n{not json\n{"name": "Brom"}\n', encoding="utf-8")
+    client = FakeClient({"characters": {1: dict(ARIA)}})
+
+    result = asyncio.run(CampaignImporter(client, 1, entity_type="characters").run(str(path)))
+
+    assert result["rows"] == 3
+    assert [error["row"] for error in result["errors"]] == [2]
+    assert result["errors"][0]["error"].startswith("invalid JSON")
+    assert result["counts"] == {"errors": 1, "update": 1, "create": 1}
+    assert len(client.writes) == 2
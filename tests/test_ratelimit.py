@@ -0,0 +1,27 @@
+from kanka_ratelimit import RateLimiter
+
+
+def test_workers_split_the_limit(monkeypatch):
+    monkeypatch.setenv("KANKA_RATE_LIMIT", "30")
+    monkeypatch.setenv("KANKA_WORKERS", "4")
+
+    limiter = RateLimiter()
+
+    assert limiter.per_minute == 7
+    assert limiter.tokens == 7
+
+
+def test_limit_reported_by_kanka_is_split_too():
+    limiter = RateLimiter(per_minute=30, workers=3)
+
+    limiter.update({"x-ratelimit-limit": "90", "x-ratelimit-remaining": "2"})
+
+    assert limiter.per_minute == 30
+    assert limiter.tokens == 2
+
+
+def test_a_single_process_keeps_the_whole_limit(monkeypatch):
+    monkeypatch.delenv("KANKA_WORKERS", raising=False)
+
+    assert RateLimiter(per_minute=30).per_minute == 30
+    assert RateLimiter(per_minute=3, workers=8).per_minute == 1
@@ -0,0 +1,41 @@
+import asyncio
+from kanka_registry import WorkspaceRegistry
+
+
+def test_shutdown_waits_for_evicted_workspaces_to_close(monkeypatch):
+    monkeypatch.delenv("KANKA_STORE_PATH", raising=False)
+    monkeypatch.delenv("KANKA_WRITE_BEHIND", raising=False)
+
+    async def scenario():
+        registry = WorkspaceRegistry(max_workspaces=1)
+        evicted = registry.get("first-key")
+        registry.get("second-key")
+        closing = len(registry._closing)
+        await registry.close_writes()
+        return registry, evicted, closing
+
+    registry, evicted, closing = asyncio.run(scenario())
+    assert closing == 1
+    assert registry._closing == set()
+    assert evicted.client.session.is_closed
+    assert registry.stats()["closed"] == 1
+
+
+def test_workspace_in_use_is_not_evicted(monkeypatch):
+    monkeypatch.delenv("KANKA_STORE_PATH", raising=False)
+
+    async def scenario():
+        registry = WorkspaceRegistry(max_workspaces=1)
+        busy = registry.get("first-key")
+        busy.acquire()
+        registry.get("second-key")
+        active = registry.stats()["active"]
+        busy.release()
+        registry.get("third-key")
+        await registry.close_writes()
+        return active, registry, busy
+
+    active, registry, busy = asyncio.run(scenario())
+    assert active == 2
+    assert registry.stats()["active"] == 1
+    assert busy.client.session.is_closed
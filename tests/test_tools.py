@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from mcp.server.fastmcp.exceptions import ToolError
+from mcp.server.fastmcp.tools import Tool
+from mcp.server.fastmcp.utilities.func_metadata import func_metadata
+import kanka_mcp
+
+LAZY_TOOLS = {
+    name: tool for name, tool in kanka_mcp.mcp._tool_manager._tools.items() if isinstance(tool, kanka_mcp.LazyTool)
+}
+
+
+def test_tools_are_registered_lazily():
+    assert len(LAZY_TOOLS) == len(kanka_mcp.mcp._tool_manager._tools) > 100
+
+
+@pytest.mark.parametrize("name", sorted(LAZY_TOOLS))
+def test_lazy_tool_matches_fastmcp(name):
+    tool = LAZY_TOOLS[name]
+    eager = Tool.from_function(tool.fn, name=tool.name, description=tool.description)
+
+    assert tool.parameters == eager.parameters
+    assert tool.output_schema == eager.output_schema
+    assert (tool.name, tool.description, tool.is_async, tool.context_kwarg) == (
+        eager.name, eager.description, eager.is_async, eager.context_kwarg,
+    )
+    metadata = tool.fn_metadata or func_metadata(tool.fn)
+    assert metadata.arg_model.model_json_schema() == eager.fn_metadata.arg_model.model_json_schema()
+    assert metadata.output_schema == eager.fn_metadata.output_schema
+
+
+def test_lazy_tool_validates_arguments_on_first_call():
+    tool = LAZY_TOOLS["get_character"]
+
+    with pytest.raises(ToolError, match="validation error"):
+        asyncio.run(tool.run({"campaign_id": "not a number", "character_id": 1}))
+    assert tool.fn_metadata is not None
+
+
+def test_show_campaigns_shapes_without_touching_the_cached_response(monkeypatch):
+    campaigns = {"data": [{"id": 1, "name": "Ashfall", "entry": "<p>A <b>grim</b> world</p>", "locale": "en"}]}
+
+    class FakeClient:
+        async def get(self, path):
+            return campaigns
+
+    monkeypatch.setattr(kanka_mcp, "get_client", FakeClient)
+
+    compact = asyncio.run(kanka_mcp.show_campaigns(compact=True))
+    names = asyncio.run(kanka_mcp.show_campaigns(fields=["id", "name"]))
+
+    assert compact["data"] == [{"id": 1, "name": "Ashfall", "entry": "A grim world"}]
+    assert names["data"] == [{"id": 1, "name": "Ashfall"}]
+    assert campaigns["data"][0]["locale"] == "en"
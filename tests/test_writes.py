@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import httpx
+import kanka_writes
+from kanka_writes import MAX_ATTEMPTS, WriteBehindQueue
+
+PATH = "campaigns/1/characters/7"
+
+
+class FakeClient:
+    """Stand-in for KankaClient whose PATCHes fail with `status` the first `failures` times."""
+
+    def __init__(self, failures=0, status=503):
+        self.failures = failures
+        self.status = status
+        self.patches = []
+
+    async def patch(self, path, data, priority=None):
+        self.patches.append((path, dict(data)))
+        if len(self.patches) <= self.failures:
+            request = httpx.Request("PATCH", f"https://kanka.test/{path}")
+            response = httpx.Response(self.status, request=request)
+            raise httpx.HTTPStatusError("upstream error", request=request, response=response)
+        return {"data": {"id": 7, **data, "updated_at": "now"}}
+
+
+def test_successive_edits_are_sent_as_one_patch():
+    async def scenario():
+        client = FakeClient()
+        queue = WriteBehindQueue(client, window=60)
+        await queue.patch(PATH, {"title": "Bard"})
+        await queue.patch(PATH, {"title": "Queen", "age": "31"})
+        await queue.flush()
+        return client, queue.drain()
+
+    client, results = asyncio.run(scenario())
+
+    assert client.patches == [(PATH, {"title": "Queen", "age": "31"})]
+    assert [(result["status"], result["write_ids"]) for result in results] == [("written", [1, 2])]
+
+
+def test_close_retries_inline_then_logs_unsent_writes(monkeypatch, caplog):
+    monkeypatch.setattr(kanka_writes, "CLOSE_RETRY_DELAY", 0)
+
+    async def scenario():
+        client = FakeClient(failures=100)
+        queue = WriteBehindQueue(client, window=60)
+        await queue.patch(PATH, {"is_dead": True})
+        await queue.close()
+        return client, queue
+
+    with caplog.at_level(logging.ERROR, logger="kanka_writes"):
+        client, queue = asyncio.run(scenario())
+
+    assert len(client.patches) == MAX_ATTEMPTS
+    assert queue.pending == {}
+    assert queue.drain()[-1]["status"] == "failed"
+    assert PATH in caplog.text and "[1]" in caplog.text and '"is_dead": true' in caplog.text
+
+
+def test_close_sends_writes_that_recover(monkeypatch):
+    monkeypatch.setattr(kanka_writes, "CLOSE_RETRY_DELAY", 0)
+
+    async def scenario():
+        client = FakeClient(failures=2)
+        queue = WriteBehindQueue(client, window=60)
+        await queue.patch(PATH, {"title": "Queen"})
+        await queue.close()
+        return client, queue.drain()
+
+    client, results = asyncio.run(scenario())
+
+    assert len(client.patches) == 3
+    assert [result["status"] for result in results] == ["retrying", "retrying", "written"]
+
+
+def test_client_errors_are_not_retried():
+    async def scenario():
+        client = FakeClient(failures=1, status=422)
+        queue = WriteBehindQueue(client, window=60)
+        await queue.patch(PATH, {"age": "x"})
+        await queue.flush()
+        return client, queue
+
+    client, queue = asyncio.run(scenario())
+
+    assert len(client.patches) == 1
+    assert queue.pending == {}
+    assert queue.drain()[0]["status"] == "failed"